@@ -4,13 +4,11 @@
 """
 
 import asyncio
-import random
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List
 
 from agents.mcp_base_agent import MCPBaseAgent
-from models.mcp import MCPCommand, MCPMessage
 
 
 class AudioAgent(MCPBaseAgent):
@@ -88,40 +86,6 @@ class AudioAgent(MCPBaseAgent):
             "child": {"name": "童声", "pitch": 4, "speed": 1.1, "tone": "innocent"},
         }
     
-    async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息"""
-        if not isinstance(message.body, MCPCommand):
-            return message.create_error_response(
-                error_code="INVALID_MESSAGE",
-                error_message="预期收到命令消息"
-            )
-        
-        command = message.body
-        action = command.action
-        
-        self.logger.info(f"收到命令: {action}")
-        
-        handler = self._command_handlers.get(action)
-        if not handler:
-            return message.create_error_response(
-                error_code="UNKNOWN_COMMAND",
-                error_message=f"未知命令: {action}"
-            )
-        
-        try:
-            result = await handler(command.parameters, message.header.session_id)
-            return message.create_response(
-                success=True,
-                message=f"命令 {action} 执行成功",
-                data=result
-            )
-        except Exception as e:
-            self.logger.error(f"执行命令 {action} 时发生错误: {str(e)}", exc_info=True)
-            return message.create_error_response(
-                error_code="EXECUTION_ERROR",
-                error_message=f"执行命令时发生错误: {str(e)}"
-            )
-    
     async def _handle_generate_audio(
         self,
         parameters: Dict[str, Any],
@@ -136,7 +100,7 @@ class AudioAgent(MCPBaseAgent):
         if not script:
             raise ValueError("缺少必要参数: script")
         
-        self.logger.info(f"开始生成音频: 语音风格={voice_style}, 音乐风格={music_style}")
+        self.logger.info("开始生成音频: 语音风格=%s, 音乐风格=%s", voice_style, music_style)
         
         # 并行生成语音和音乐
         voice_task = asyncio.create_task(
@@ -182,7 +146,7 @@ class AudioAgent(MCPBaseAgent):
             narration = scene.get("narration", "")
             if narration:
                 # 模拟生成延迟
-                await asyncio.sleep(random.uniform(0.5, 1.5))
+                await self._simulate_delay(0.5, 1.5)
                 
                 clip_id = f"voice_{uuid.uuid4().hex[:8]}"
                 voice_clips.append({
@@ -207,7 +171,7 @@ class AudioAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """生成背景音乐"""
         # 模拟生成延迟
-        await asyncio.sleep(random.uniform(2, 4))
+        await self._simulate_delay(2, 4)
         
         music_id = f"music_{uuid.uuid4().hex[:8]}"
         
@@ -215,8 +179,8 @@ class AudioAgent(MCPBaseAgent):
             "music_id": music_id,
             "style": style,
             "duration": duration,
-            "bpm": random.randint(80, 140),
-            "key": random.choice(["C", "D", "E", "F", "G", "A", "B"]) + random.choice(["major", "minor"]),
+            "bpm": self._rng.randint(80, 140),
+            "key": self._rng.choice(["C", "D", "E", "F", "G", "A", "B"]) + self._rng.choice(["major", "minor"]),
             "file_path": f"/storage/temp/{session_id}/{music_id}.mp3"
         }
     
@@ -228,7 +192,7 @@ class AudioAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """混合语音和背景音乐"""
         # 模拟混合延迟
-        await asyncio.sleep(random.uniform(1, 2))
+        await self._simulate_delay(1, 2)
         
         mixed_id = f"mixed_{uuid.uuid4().hex[:8]}"
         
@@ -254,7 +218,7 @@ class AudioAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: text")
         
         # 模拟生成延迟
-        await asyncio.sleep(random.uniform(1, 3))
+        await self._simulate_delay(1, 3)
         
         voice_id = f"voice_{uuid.uuid4().hex[:8]}"
         preset = self._voice_presets.get(voice_preset, self._voice_presets["male_young"])
@@ -289,7 +253,7 @@ class AudioAgent(MCPBaseAgent):
         prompt = parameters.get("prompt", "")
         
         # 模拟生成延迟
-        await asyncio.sleep(random.uniform(3, 6))
+        await self._simulate_delay(3, 6)
         
         music_id = f"music_{uuid.uuid4().hex[:8]}"
         
@@ -301,9 +265,9 @@ class AudioAgent(MCPBaseAgent):
             "duration": duration,
             "file_path": f"/storage/temp/{session_id}/{music_id}.mp3",
             "metadata": {
-                "bpm": random.randint(80, 140),
-                "key": random.choice(["C", "D", "E", "F", "G", "A", "B"]) + " " + random.choice(["major", "minor"]),
-                "instruments": random.sample(["piano", "guitar", "drums", "bass", "synth", "strings"], 3),
+                "bpm": self._rng.randint(80, 140),
+                "key": self._rng.choice(["C", "D", "E", "F", "G", "A", "B"]) + " " + self._rng.choice(["major", "minor"]),
+                "instruments": self._rng.sample(["piano", "guitar", "drums", "bass", "synth", "strings"], 3),
                 "prompt": prompt
             }
         }
@@ -319,7 +283,7 @@ class AudioAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: tracks")
         
         # 模拟混合延迟
-        await asyncio.sleep(random.uniform(1, 3))
+        await self._simulate_delay(1, 3)
         
         mixed_id = f"mixed_{uuid.uuid4().hex[:8]}"
         
@@ -343,7 +307,7 @@ class AudioAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: audio_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 2))
+        await self._simulate_delay(1, 2)
         
         enhanced_id = f"enhanced_{uuid.uuid4().hex[:8]}"
         
@@ -4,16 +4,18 @@
 """
 
 import asyncio
+import heapq
 import time
 import uuid
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+from operator import attrgetter
 from typing import Any, Callable, Dict, List, Optional
 
 from agents.mcp_base_agent import MCPBaseAgent
-from models.mcp import (MCPCommand, MCPMessage, MCPMessageType, MCPPriority,
-                        MCPResponse, MCPStatus)
+from models.mcp import (MCPMessage, MCPMessageType, MCPPriority, MCPResponse,
+                        MCPStatus)
 from utils.mcp_message_bus import message_bus
 
 
@@ -38,6 +40,17 @@ class WorkflowStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+# 已结束的工作流状态
+_FINISHED_STATUSES = frozenset({
+    WorkflowStatus.COMPLETED,
+    WorkflowStatus.FAILED,
+    WorkflowStatus.CANCELLED,
+})
+
+# 变化时需要通知订阅者的 WorkflowContext 字段
+_NOTIFY_FIELDS = frozenset({"status", "current_stage", "updated_at"})
+
+
 @dataclass
 class StageInfo:
     """阶段信息"""
@@ -63,6 +76,17 @@ class WorkflowContext:
     final_video: Optional[Dict[str, Any]] = None
     created_at: datetime = field(default_factory=datetime.now)
     updated_at: datetime = field(default_factory=datetime.now)
+    # to_dict 结果缓存：(版本, 字典)，版本为 to_dict 依赖的可变状态
+    _dict_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    # 状态变化事件，有订阅者时才创建，每次变化后替换为新事件
+    _changed: Optional[asyncio.Event] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        # 状态、阶段或更新时间变化时通知订阅者；初始化阶段 _changed 尚未赋值
+        if name in _NOTIFY_FIELDS and getattr(self, "_changed", None) is not None:
+            self._changed.set()
+            self._changed = None
     
     def __post_init__(self):
         # 初始化所有阶段
@@ -77,9 +101,33 @@ class WorkflowContext:
                 setattr(self.stages[stage], key, value)
         self.updated_at = datetime.now()
     
+    def changed(self) -> asyncio.Event:
+        """
+        获取下一次状态变化时触发的事件
+        
+        应在读取当前状态之前获取，避免错过读取与等待之间发生的变化
+        """
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+    
+    @property
+    def is_finished(self) -> bool:
+        """工作流是否已结束"""
+        return self.status in _FINISHED_STATUSES
+    
+    @property
+    def _dict_version(self) -> tuple:
+        """to_dict 缓存版本；阶段信息只经 update_stage 修改，会同时刷新 updated_at"""
+        return (self.status, self.current_stage, self.updated_at)
+    
     def to_dict(self) -> Dict[str, Any]:
-        """转换为字典"""
-        return {
+        """转换为字典，状态未变化时返回缓存结果（调用方不应修改返回值）"""
+        version = self._dict_version
+        if self._dict_cache is not None and self._dict_cache[0] == version:
+            return self._dict_cache[1]
+        
+        data = {
             "workflow_id": self.workflow_id,
             "session_id": self.session_id,
             "status": self.status.value,
@@ -96,6 +144,8 @@ class WorkflowContext:
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
+        self._dict_cache = (version, data)
+        return data
 
 
 class CentralAgent(MCPBaseAgent):
@@ -138,43 +188,6 @@ class CentralAgent(MCPBaseAgent):
         # 进度回调
         self._progress_callbacks: Dict[str, List[Callable]] = {}
     
-    async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息"""
-        if not isinstance(message.body, MCPCommand):
-            return message.create_error_response(
-                error_code="INVALID_MESSAGE",
-                error_message="预期收到命令消息"
-            )
-        
-        command = message.body
-        action = command.action
-        
-        self.logger.info(f"收到命令: {action}")
-        
-        # 查找处理器
-        handler = self._command_handlers.get(action)
-        if not handler:
-            return message.create_error_response(
-                error_code="UNKNOWN_COMMAND",
-                error_message=f"未知命令: {action}"
-            )
-        
-        try:
-            # 执行处理器
-            result = await handler(command.parameters, message.header.session_id)
-            
-            return message.create_response(
-                success=True,
-                message=f"命令 {action} 执行成功",
-                data=result
-            )
-        except Exception as e:
-            self.logger.error(f"执行命令 {action} 时发生错误: {str(e)}", exc_info=True)
-            return message.create_error_response(
-                error_code="EXECUTION_ERROR",
-                error_message=f"执行命令时发生错误: {str(e)}"
-            )
-    
     async def _handle_create_video(
         self,
         parameters: Dict[str, Any],
@@ -196,7 +209,7 @@ class CentralAgent(MCPBaseAgent):
         
         self._workflows[workflow_id] = workflow
         
-        self.logger.info(f"创建工作流: {workflow_id}, 主题: {theme}")
+        self.logger.info("创建工作流: %s, 主题: %s", workflow_id, theme)
         
         # 异步执行工作流
         asyncio.create_task(self._execute_workflow(workflow_id))
@@ -211,7 +224,7 @@ class CentralAgent(MCPBaseAgent):
         """执行工作流"""
         workflow = self._workflows.get(workflow_id)
         if not workflow:
-            self.logger.error(f"工作流 {workflow_id} 不存在")
+            self.logger.error("工作流 %s 不存在", workflow_id)
             return
         
         workflow.status = WorkflowStatus.PROCESSING
@@ -308,7 +321,7 @@ class CentralAgent(MCPBaseAgent):
             workflow.status = WorkflowStatus.COMPLETED
             workflow.current_stage = WorkflowStage.COMPLETED
             
-            self.logger.info(f"工作流 {workflow_id} 完成")
+            self.logger.info("工作流 %s 完成", workflow_id)
             
             # 广播完成事件
             await self.broadcast_event(
@@ -318,7 +331,7 @@ class CentralAgent(MCPBaseAgent):
             )
             
         except Exception as e:
-            self.logger.error(f"工作流 {workflow_id} 执行失败: {str(e)}", exc_info=True)
+            self.logger.error("工作流 %s 执行失败: %s", workflow_id, e, exc_info=True)
             workflow.status = WorkflowStatus.FAILED
             workflow.update_stage(
                 workflow.current_stage.value,
@@ -356,7 +369,7 @@ class CentralAgent(MCPBaseAgent):
         if not target_agent:
             raise ValueError(f"未找到阶段 {stage} 对应的代理")
         
-        self.logger.info(f"执行阶段 {stage.value}: {action} -> {target_agent}")
+        self.logger.info("执行阶段 %s: %s -> %s", stage.value, action, target_agent)
         
         # 广播阶段开始事件
         await self.broadcast_event(
@@ -400,7 +413,7 @@ class CentralAgent(MCPBaseAgent):
                     # 保存阶段结果
                     self._save_stage_result(workflow, stage, result)
                     
-                    self.logger.info(f"阶段 {stage.value} 完成")
+                    self.logger.info("阶段 %s 完成", stage.value)
                     
                     # 广播阶段完成事件
                     await self.broadcast_event(
@@ -418,7 +431,7 @@ class CentralAgent(MCPBaseAgent):
                 raise Exception("收到非预期的响应类型")
                 
         except Exception as e:
-            self.logger.error(f"阶段 {stage.value} 失败: {str(e)}")
+            self.logger.error("阶段 %s 失败: %s", stage.value, e)
             workflow.update_stage(
                 stage.value,
                 status="failed",
@@ -487,7 +500,7 @@ class CentralAgent(MCPBaseAgent):
         
         workflow.status = WorkflowStatus.CANCELLED
         
-        self.logger.info(f"工作流 {workflow_id} 已取消")
+        self.logger.info("工作流 %s 已取消", workflow_id)
         
         return {
             "workflow_id": workflow_id,
@@ -564,17 +577,13 @@ class CentralAgent(MCPBaseAgent):
         status_filter = parameters.get("status")
         limit = parameters.get("limit", 10)
         
-        workflows = []
-        for wf_id, workflow in self._workflows.items():
-            if status_filter and workflow.status.value != status_filter:
-                continue
-            workflows.append(workflow.to_dict())
+        workflows = self.get_all_workflows(status_filter or None)
         
-        # 按创建时间排序
-        workflows.sort(key=lambda x: x["created_at"], reverse=True)
+        # 取创建时间最新的 limit 个，只序列化返回的部分
+        latest = heapq.nlargest(limit, workflows, key=attrgetter("created_at"))
         
         return {
-            "workflows": workflows[:limit],
+            "workflows": [w.to_dict() for w in latest],
             "total": len(workflows)
         }
     
@@ -583,12 +592,12 @@ class CentralAgent(MCPBaseAgent):
         event_type = message.body.event_type
         data = message.body.data
         
-        self.logger.debug(f"收到事件: {event_type}")
+        self.logger.debug("收到事件: %s", event_type)
         
         # 处理代理状态事件
         if event_type == "agent.offline":
             agent_id = data.get("agent_id")
-            self.logger.warning(f"代理 {agent_id} 离线")
+            self.logger.warning("代理 %s 离线", agent_id)
             # 可以在这里处理代理离线的情况，如重新分配任务
         
         return None
@@ -597,6 +606,8 @@ class CentralAgent(MCPBaseAgent):
         """获取工作流"""
         return self._workflows.get(workflow_id)
     
-    def get_all_workflows(self) -> List[WorkflowContext]:
-        """获取所有工作流"""
-        return list(self._workflows.values())
+    def get_all_workflows(self, status: Optional[str] = None) -> List[WorkflowContext]:
+        """获取所有工作流，可按状态筛选"""
+        if status is None:
+            return list(self._workflows.values())
+        return [w for w in self._workflows.values() if w.status.value == status]
@@ -3,14 +3,11 @@
 负责生成视频脚本、文案和创意内容
 """
 
-import asyncio
-import random
 import uuid
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from agents.mcp_base_agent import MCPBaseAgent
-from models.mcp import MCPCommand, MCPMessage
 
 
 class ContentAgent(MCPBaseAgent):
@@ -70,40 +67,6 @@ class ContentAgent(MCPBaseAgent):
             },
         }
     
-    async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息"""
-        if not isinstance(message.body, MCPCommand):
-            return message.create_error_response(
-                error_code="INVALID_MESSAGE",
-                error_message="预期收到命令消息"
-            )
-        
-        command = message.body
-        action = command.action
-        
-        self.logger.info(f"收到命令: {action}")
-        
-        handler = self._command_handlers.get(action)
-        if not handler:
-            return message.create_error_response(
-                error_code="UNKNOWN_COMMAND",
-                error_message=f"未知命令: {action}"
-            )
-        
-        try:
-            result = await handler(command.parameters, message.header.session_id)
-            return message.create_response(
-                success=True,
-                message=f"命令 {action} 执行成功",
-                data=result
-            )
-        except Exception as e:
-            self.logger.error(f"执行命令 {action} 时发生错误: {str(e)}", exc_info=True)
-            return message.create_error_response(
-                error_code="EXECUTION_ERROR",
-                error_message=f"执行命令时发生错误: {str(e)}"
-            )
-    
     async def _handle_create_script(
         self,
         parameters: Dict[str, Any],
@@ -118,7 +81,7 @@ class ContentAgent(MCPBaseAgent):
         if not theme:
             raise ValueError("缺少必要参数: theme")
         
-        self.logger.info(f"创建脚本: 主题={theme}, 风格={style}, 时长={duration}秒")
+        self.logger.info("创建脚本: 主题=%s, 风格=%s, 时长=%s秒", theme, style, duration)
         
         # 获取风格模板
         style_template = self._style_templates.get(style, self._style_templates["幽默"])
@@ -156,7 +119,7 @@ class ContentAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """生成脚本内容"""
         # 模拟 AI 生成延迟
-        await asyncio.sleep(random.uniform(1, 3))
+        await self._simulate_delay(1, 3)
         
         # 计算分镜数量（假设每个分镜约 5-10 秒）
         num_scenes = max(3, duration // 8)
@@ -171,7 +134,7 @@ class ContentAgent(MCPBaseAgent):
             f"震惊！{theme}竟然可以这样...",
             f"3分钟带你了解{theme}的真相",
         ]
-        hook = random.choice(hooks)
+        hook = self._rng.choice(hooks)
         
         # 生成分镜
         scenes = []
@@ -283,14 +246,14 @@ class ContentAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: script")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1.5))
+        await self._simulate_delay(0.5, 1.5)
         
         storyboard = []
         for scene in script.get("scenes", []):
             storyboard.append({
                 "scene_id": scene["scene_id"],
-                "shot_type": random.choice(["wide", "medium", "close-up", "detail"]),
-                "camera_movement": random.choice(["static", "pan_left", "pan_right", "zoom_in", "zoom_out"]),
+                "shot_type": self._rng.choice(["wide", "medium", "close-up", "detail"]),
+                "camera_movement": self._rng.choice(["static", "pan_left", "pan_right", "zoom_in", "zoom_out"]),
                 "duration": scene["duration"],
                 "visual_description": scene["description"],
                 "audio_cue": scene.get("narration", ""),
@@ -315,7 +278,7 @@ class ContentAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: script")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 2))
+        await self._simulate_delay(1, 2)
         
         # 简单地修改一些内容（实际应该使用 AI 进行优化）
         refined_script = script.copy()
@@ -342,7 +305,7 @@ class ContentAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: script")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
+        await self._simulate_delay(0.5, 1)
         
         captions = []
         current_time = 0
@@ -381,7 +344,7 @@ class ContentAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: theme")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.3, 0.8))
+        await self._simulate_delay(0.3, 0.8)
         
         hook_templates = [
             f"你知道{theme}背后的秘密吗？",
@@ -394,10 +357,10 @@ class ContentAgent(MCPBaseAgent):
             f"今天来聊一个大家都关心的话题：{theme}",
         ]
         
-        hooks = random.sample(hook_templates, min(count, len(hook_templates)))
+        hooks = self._rng.sample(hook_templates, min(count, len(hook_templates)))
         
         return {
             "theme": theme,
             "style": style,
-            "hooks": [{"text": hook, "score": random.uniform(0.7, 1.0)} for hook in hooks]
+            "hooks": [{"text": hook, "score": self._rng.uniform(0.7, 1.0)} for hook in hooks]
         }
@@ -3,14 +3,11 @@
 负责将视频发布到各个平台
 """
 
-import asyncio
-import random
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List
 
 from agents.mcp_base_agent import MCPBaseAgent
-from models.mcp import MCPCommand, MCPMessage
 
 
 class DistributionAgent(MCPBaseAgent):
@@ -102,40 +99,6 @@ class DistributionAgent(MCPBaseAgent):
         # 定时发布任务
         self._scheduled_tasks: Dict[str, Dict[str, Any]] = {}
     
-    async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息"""
-        if not isinstance(message.body, MCPCommand):
-            return message.create_error_response(
-                error_code="INVALID_MESSAGE",
-                error_message="预期收到命令消息"
-            )
-        
-        command = message.body
-        action = command.action
-        
-        self.logger.info(f"收到命令: {action}")
-        
-        handler = self._command_handlers.get(action)
-        if not handler:
-            return message.create_error_response(
-                error_code="UNKNOWN_COMMAND",
-                error_message=f"未知命令: {action}"
-            )
-        
-        try:
-            result = await handler(command.parameters, message.header.session_id)
-            return message.create_response(
-                success=True,
-                message=f"命令 {action} 执行成功",
-                data=result
-            )
-        except Exception as e:
-            self.logger.error(f"执行命令 {action} 时发生错误: {str(e)}", exc_info=True)
-            return message.create_error_response(
-                error_code="EXECUTION_ERROR",
-                error_message=f"执行命令时发生错误: {str(e)}"
-            )
-    
     async def _handle_distribute_video(
         self,
         parameters: Dict[str, Any],
@@ -150,7 +113,7 @@ class DistributionAgent(MCPBaseAgent):
         if not video:
             raise ValueError("缺少必要参数: video")
         
-        self.logger.info(f"分发视频到平台: {platforms}")
+        self.logger.info("分发视频到平台: %s", platforms)
         
         distribution_id = f"dist_{uuid.uuid4().hex[:8]}"
         results = {}
@@ -212,7 +175,7 @@ class DistributionAgent(MCPBaseAgent):
         self._validate_video_for_platform(video, platform_config)
         
         # 模拟发布延迟
-        await asyncio.sleep(random.uniform(2, 5))
+        await self._simulate_delay(2, 5)
         
         publish_id = f"pub_{uuid.uuid4().hex[:8]}"
         
@@ -330,7 +293,7 @@ class DistributionAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: video")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
+        await self._simulate_delay(0.5, 1)
         
         # 生成优化后的元数据
         theme = script.get("metadata", {}).get("theme", "")
@@ -6,8 +6,9 @@ MCP基础代理类
 import asyncio
 import logging
 import os
+import random
 import time
-from abc import ABC, abstractmethod
+from abc import ABC
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
 from models.mcp import (MCPCommand, MCPContentType, MCPError, MCPEvent,
@@ -41,9 +42,18 @@ class MCPBaseAgent(ABC):
         # 启动时间
         self._start_time = None
         
+        # 每个代理独立的随机数生成器，不与其他代理共享模块级 random 实例
+        self._rng = random.Random()
+        
+        # 是否模拟外部服务耗时（测试和本地开发时可通过 MCP_MOCK_DELAYS=0 关闭）
+        self._mock_delays = os.environ.get("MCP_MOCK_DELAYS", "1") == "1"
+        
         # 消息处理器映射
         self._message_handlers = {}
         
+        # 命令处理器映射（action -> 处理协程），由子类填充
+        self._command_handlers: Dict[str, Callable] = {}
+        
         # 注册消息处理器
         self._register_handlers()
         
@@ -73,7 +83,7 @@ class MCPBaseAgent(ABC):
 
     async def initialize(self):
         """初始化代理，包括订阅消息"""
-        self.logger.info(f"初始化代理 {self.agent_id}")
+        self.logger.info("初始化代理 %s", self.agent_id)
         
         # 订阅发送给该代理的消息
         await message_bus.subscribe_direct(self.agent_id, self._message_callback)
@@ -87,15 +97,15 @@ class MCPBaseAgent(ABC):
         # 更新状态
         self._status["status"] = "initialized"
         
-        self.logger.info(f"代理 {self.agent_id} 初始化完成")
+        self.logger.info("代理 %s 初始化完成", self.agent_id)
 
     async def start(self):
         """启动代理，包括启动心跳任务"""
         if self.is_running:
-            self.logger.warning(f"代理 {self.agent_id} 已经在运行中")
+            self.logger.warning("代理 %s 已经在运行中", self.agent_id)
             return
         
-        self.logger.info(f"启动代理 {self.agent_id}")
+        self.logger.info("启动代理 %s", self.agent_id)
         
         # 设置运行状态
         self.is_running = True
@@ -112,15 +122,15 @@ class MCPBaseAgent(ABC):
         # 调用子类的启动方法
         await self.on_start()
         
-        self.logger.info(f"代理 {self.agent_id} 启动完成")
+        self.logger.info("代理 %s 启动完成", self.agent_id)
 
     async def stop(self):
         """停止代理，清理资源"""
         if not self.is_running:
-            self.logger.warning(f"代理 {self.agent_id} 未在运行")
+            self.logger.warning("代理 %s 未在运行", self.agent_id)
             return
         
-        self.logger.info(f"停止代理 {self.agent_id}")
+        self.logger.info("停止代理 %s", self.agent_id)
         
         # 设置运行状态
         self.is_running = False
@@ -144,7 +154,7 @@ class MCPBaseAgent(ABC):
         # 调用子类的停止方法
         await self.on_stop()
         
-        self.logger.info(f"代理 {self.agent_id} 已停止")
+        self.logger.info("代理 %s 已停止", self.agent_id)
 
     async def _message_callback(self, message: MCPMessage):
         """处理接收到的消息"""
@@ -157,7 +167,7 @@ class MCPBaseAgent(ABC):
                 return
             
             # 记录消息接收
-            self.logger.debug(f"收到消息: {message.header.message_id}, 类型: {message_type}, 来源: {message.header.source}")
+            self.logger.debug("收到消息: %s, 类型: %s, 来源: %s", message.header.message_id, message_type, message.header.source)
             
             # 获取对应的处理器
             handler = self._message_handlers.get(message_type)
@@ -173,10 +183,10 @@ class MCPBaseAgent(ABC):
                 # 更新状态
                 self._status["messages_processed"] += 1
             else:
-                self.logger.warning(f"未知消息类型: {message_type}")
+                self.logger.warning("未知消息类型: %s", message_type)
                 
         except Exception as e:
-            self.logger.error(f"处理消息 {message.header.message_id} 时发生错误: {str(e)}", exc_info=True)
+            self.logger.error("处理消息 %s 时发生错误: %s", message.header.message_id, e, exc_info=True)
             
             # 更新状态
             self._status["errors"] += 1
@@ -193,7 +203,7 @@ class MCPBaseAgent(ABC):
 
     async def _send_heartbeats(self):
         """定期发送心跳消息"""
-        self.logger.info(f"代理 {self.agent_id} 开始发送心跳")
+        self.logger.info("代理 %s 开始发送心跳", self.agent_id)
         
         while self.is_running:
             try:
@@ -215,13 +225,13 @@ class MCPBaseAgent(ABC):
                 await asyncio.sleep(self._heartbeat_interval)
                 
             except asyncio.CancelledError:
-                self.logger.info(f"代理 {self.agent_id} 心跳任务被取消")
+                self.logger.info("代理 %s 心跳任务被取消", self.agent_id)
                 break
             except Exception as e:
-                self.logger.error(f"发送心跳时发生错误: {str(e)}", exc_info=True)
+                self.logger.error("发送心跳时发生错误: %s", e, exc_info=True)
                 await asyncio.sleep(self._heartbeat_interval)
         
-        self.logger.info(f"代理 {self.agent_id} 心跳任务结束")
+        self.logger.info("代理 %s 心跳任务结束", self.agent_id)
 
     async def _get_current_load(self) -> float:
         """获取当前负载情况，返回0-1之间的值"""
@@ -254,10 +264,17 @@ class MCPBaseAgent(ABC):
             timeout_seconds=timeout_seconds
         )
         
-        # 发送命令
-        message_id = await message_bus.publish(command_msg)
+        # 需要等待响应时先登记等待，再发送命令
+        if wait_for_response:
+            message_bus.expect(command_msg.header.message_id)
+        try:
+            message_id = await message_bus.publish(command_msg)
+        except Exception:
+            # 发布失败时不会再等待响应，撤销已登记的等待
+            message_bus.discard(command_msg.header.message_id)
+            raise
         
-        self.logger.debug(f"发送命令: {action}, 目标: {target}, 消息ID: {message_id}")
+        self.logger.debug("发送命令: %s, 目标: %s, 消息ID: %s", action, target, message_id)
         
         # 如果需要等待响应
         if wait_for_response:
@@ -269,10 +286,10 @@ class MCPBaseAgent(ABC):
             )
             
             if response:
-                self.logger.debug(f"收到响应: {response.header.message_id}, 来源: {response.header.source}")
+                self.logger.debug("收到响应: %s, 来源: %s", response.header.message_id, response.header.source)
                 return response
             else:
-                self.logger.warning(f"等待命令 {action} 的响应超时")
+                self.logger.warning("等待命令 %s 的响应超时", action)
                 return None
         
         return None
@@ -300,7 +317,7 @@ class MCPBaseAgent(ABC):
         # 发送事件
         message_id = await message_bus.publish(event_msg)
         
-        self.logger.debug(f"发送事件: {event_type}, 目标: {target}, 消息ID: {message_id}")
+        self.logger.debug("发送事件: %s, 目标: %s, 消息ID: %s", event_type, target, message_id)
         
         return message_id
 
@@ -326,7 +343,7 @@ class MCPBaseAgent(ABC):
         # 发送事件
         message_id = await message_bus.publish(event_msg)
         
-        self.logger.debug(f"广播事件: {event_type}, 消息ID: {message_id}")
+        self.logger.debug("广播事件: %s, 消息ID: %s", event_type, message_id)
         
         return message_id
 
@@ -346,16 +363,48 @@ class MCPBaseAgent(ABC):
         # 返回状态副本
         return dict(self._status)
 
-    @abstractmethod
     async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息，子类必须实现"""
-        # 子类必须实现此方法
-        pass
+        """处理命令消息，按 action 分发到子类注册的 _command_handlers"""
+        command = message.body
+        # 精确类型比较比 isinstance 更快，消息体不会是 MCPCommand 的子类
+        if command.__class__ is not MCPCommand:
+            return message.create_error_response(
+                error_code="INVALID_MESSAGE",
+                error_message="预期收到命令消息"
+            )
+        
+        action = command.action
+        
+        self.logger.info("收到命令: %s", action)
+        
+        handler = self._command_handlers.get(action)
+        if handler is None:
+            return message.create_error_response(
+                error_code="UNKNOWN_COMMAND",
+                error_message=f"未知命令: {action}"
+            )
+        
+        try:
+            result = await handler(command.parameters, message.header.session_id)
+            return message.create_response(
+                success=True,
+                message=f"命令 {action} 执行成功",
+                data=result
+            )
+        except Exception as e:
+            # 参数校验失败等错误可能成批出现，仅在 DEBUG 级别记录完整堆栈
+            self.logger.error("执行命令 %s 时发生错误: %s", action, e)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("命令 %s 异常堆栈", action, exc_info=True)
+            return message.create_error_response(
+                error_code="EXECUTION_ERROR",
+                error_message=f"执行命令时发生错误: {str(e)}"
+            )
 
     async def handle_response(self, message: MCPMessage) -> Optional[MCPMessage]:
         """处理响应消息"""
         # 默认实现，子类可以重写
-        self.logger.debug(f"收到响应消息: {message.header.message_id}")
+        self.logger.debug("收到响应消息: %s", message.header.message_id)
         
         # 响应消息通常不需要回复
         return None
@@ -363,7 +412,7 @@ class MCPBaseAgent(ABC):
     async def handle_event(self, message: MCPMessage) -> Optional[MCPMessage]:
         """处理事件消息"""
         # 默认实现，子类可以重写
-        self.logger.debug(f"收到事件消息: {message.header.message_id}, 事件类型: {message.body.event_type}")
+        self.logger.debug("收到事件消息: %s, 事件类型: %s", message.header.message_id, message.body.event_type)
         
         # 事件消息通常不需要回复
         return None
@@ -371,7 +420,7 @@ class MCPBaseAgent(ABC):
     async def handle_data(self, message: MCPMessage) -> Optional[MCPMessage]:
         """处理数据消息"""
         # 默认实现，子类可以重写
-        self.logger.debug(f"收到数据消息: {message.header.message_id}")
+        self.logger.debug("收到数据消息: %s", message.header.message_id)
         
         # 数据消息通常不需要回复
         return None
@@ -379,7 +428,7 @@ class MCPBaseAgent(ABC):
     async def handle_query(self, message: MCPMessage) -> Optional[MCPMessage]:
         """处理查询消息"""
         # 默认实现，子类可以重写
-        self.logger.debug(f"收到查询消息: {message.header.message_id}, 查询类型: {message.body.query_type}")
+        self.logger.debug("收到查询消息: %s, 查询类型: %s", message.header.message_id, message.body.query_type)
         
         # 查询消息通常需要回复，但默认实现不处理任何查询
         return message.create_error_response(
@@ -390,7 +439,7 @@ class MCPBaseAgent(ABC):
     async def handle_error(self, message: MCPMessage) -> Optional[MCPMessage]:
         """处理错误消息"""
         # 默认实现，子类可以重写
-        self.logger.warning(f"收到错误消息: {message.header.message_id}, 错误代码: {message.body.error_code}, 错误消息: {message.body.error_message}")
+        self.logger.warning("收到错误消息: %s, 错误代码: %s, 错误消息: %s", message.header.message_id, message.body.error_code, message.body.error_message)
         
         # 错误消息通常不需要回复
         return None
@@ -398,7 +447,7 @@ class MCPBaseAgent(ABC):
     async def handle_state_update(self, message: MCPMessage) -> Optional[MCPMessage]:
         """处理状态更新消息"""
         # 默认实现，子类可以重写
-        self.logger.debug(f"收到状态更新消息: {message.header.message_id}, 实体: {message.body.entity_id}")
+        self.logger.debug("收到状态更新消息: %s, 实体: %s", message.header.message_id, message.body.entity_id)
         
         # 状态更新消息通常不需要回复
         return None
@@ -417,4 +466,11 @@ class MCPBaseAgent(ABC):
     async def on_stop(self):
         """代理停止时调用，子类可以重写"""
         # 默认实现为空，子类可以重写
-        pass
\ No newline at end of file
+        pass
+
+    async def _simulate_delay(self, low: float, high: float):
+        """模拟外部服务耗时；关闭模拟时仅让出事件循环"""
+        if self._mock_delays:
+            await asyncio.sleep(self._rng.uniform(low, high))
+        else:
+            await asyncio.sleep(0)
\ No newline at end of file
@@ -4,13 +4,129 @@
 """
 
 import asyncio
-import random
-import uuid
+import os
+import secrets
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import aiofiles
+import aiofiles.os
+import orjson
 
 from agents.mcp_base_agent import MCPBaseAgent
-from models.mcp import MCPCommand, MCPMessage
+from utils.ffmpeg import (build_concat_command, build_encode_command,
+                          ffmpeg_available, quote_concat_path,
+                          quote_filter_path, run_ffmpeg, select_encoder)
+
+# 临时文件与输出文件根目录
+_TEMP_ROOT = "/storage/temp/"
+_OUTPUT_ROOT = "/storage/output/"
+
+
+# (质量, 分辨率) 到视频码率
+_BITRATES = MappingProxyType({
+    ("low", "720p"): "2M",
+    ("medium", "720p"): "4M",
+    ("high", "720p"): "6M",
+    ("low", "1080p"): "4M",
+    ("medium", "1080p"): "8M",
+    ("high", "1080p"): "12M",
+})
+
+# 分辨率名称到输出高度
+_RENDER_HEIGHTS = MappingProxyType({"720p": 720, "1080p": 1080})
+
+# 最终成片按宽高比的输出尺寸，片段未提供分辨率时使用
+_RENDER_SIZES = MappingProxyType({
+    "9:16": MappingProxyType({"width": 1080, "height": 1920}),
+    "16:9": MappingProxyType({"width": 1920, "height": 1080}),
+    "1:1": MappingProxyType({"width": 1080, "height": 1080}),
+})
+
+# 后期制作各阶段完成时的进度
+_STAGE_PROGRESS = MappingProxyType({"compose": 0.3, "effects": 0.6, "render": 1.0})
+
+# 可直接融合进渲染滤镜链的特效
+_EFFECT_FILTERS = MappingProxyType({
+    "vignette": "vignette=PI/4",
+    "grain": "noise=alls=10:allf=t",
+})
+
+# 字幕位置到 ASS 对齐方式（小键盘布局）
+_ASS_ALIGNMENT = {"bottom": 2, "center": 5, "top": 8}
+
+
+def _short_id() -> str:
+    """生成 8 位十六进制短 ID"""
+    return secrets.token_hex(4)
+
+
+def _estimate_size_mb(bitrate: str, duration: float) -> float:
+    """根据码率（如 "8M"）和时长估算输出文件大小（MB）"""
+    return float(bitrate.rstrip("Mm")) * duration / 8
+
+
+def _ass_color(hex_color: str) -> str:
+    """将 #RRGGBB 转换为 ASS 颜色格式 &H00BBGGRR"""
+    rgb = hex_color.lstrip("#")
+    return f"&H00{rgb[4:6]}{rgb[2:4]}{rgb[0:2]}".upper()
+
+
+def _ass_time(seconds: float) -> str:
+    """将秒数格式化为 ASS 时间戳 H:MM:SS.cc"""
+    centis = int(round(seconds * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+def _style_to_ass(name: str, style: Dict[str, Any]) -> str:
+    """将字幕样式转换为 ASS 文件头（到 [Events] 格式行为止）"""
+    primary = _ass_color(style["color"])
+    secondary = _ass_color(style.get("highlight_color", style["color"]))
+    outline_color = _ass_color(style["outline_color"])
+    outline_width = 2 if style.get("outline") else 0
+    alignment = _ASS_ALIGNMENT.get(style.get("position", "bottom"), 2)
+    
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        "PlayResX: 1080",
+        "PlayResY: 1920",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, "
+        "BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, "
+        "BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: {name},{style['font']},{style['size']},{primary},{secondary},"
+        f"{outline_color},&H80000000,0,0,0,0,100,100,0,0,1,{outline_width},0,"
+        f"{alignment},40,40,80,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _wrap_subtitle(text: str, width: int = 18) -> str:
+    """长字幕预先换行，减少 libass 自动排版的开销"""
+    if len(text) <= width:
+        return text
+    if " " in text:
+        # 有空格的文本按单词换行
+        lines, current = [], ""
+        for word in text.split():
+            if current and len(current) + 1 + len(word) > width:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        lines.append(current)
+    else:
+        lines = [text[i:i + width] for i in range(0, len(text), width)]
+    return "\\N".join(lines)
 
 
 class PostProductionAgent(MCPBaseAgent):
@@ -25,9 +141,74 @@ class PostProductionAgent(MCPBaseAgent):
     5. 生成最终输出
     """
     
-    def __init__(self):
+    # 以下静态表定义在类上，各实例共享
+    
+    # 支持的转场效果
+    _transitions = {
+        "fade": {"name": "淡入淡出", "duration": 0.5},
+        "dissolve": {"name": "溶解", "duration": 0.5},
+        "wipe": {"name": "擦除", "duration": 0.3},
+        "slide": {"name": "滑动", "duration": 0.3},
+        "zoom": {"name": "缩放", "duration": 0.4},
+        "spin": {"name": "旋转", "duration": 0.4},
+        "glitch": {"name": "故障风", "duration": 0.2},
+        "flash": {"name": "闪白", "duration": 0.15},
+    }
+    
+    # 支持的特效
+    _effects = {
+        "color_grade": {"name": "调色", "types": ["warm", "cool", "vintage", "cinematic", "vibrant"]},
+        "blur": {"name": "模糊", "types": ["gaussian", "motion", "radial"]},
+        "sharpen": {"name": "锐化", "types": ["standard", "high"]},
+        "vignette": {"name": "暗角", "intensity_range": [0.1, 1.0]},
+        "grain": {"name": "胶片颗粒", "intensity_range": [0.1, 0.5]},
+        "lens_flare": {"name": "镜头光晕", "types": ["sun", "spotlight", "rainbow"]},
+        "glitch": {"name": "故障效果", "intensity_range": [0.1, 0.8]},
+        "slow_motion": {"name": "慢动作", "speed_range": [0.25, 0.75]},
+    }
+    
+    # 字幕样式
+    _subtitle_styles = {
+        "default": {
+            "font": "思源黑体",
+            "size": 48,
+            "color": "#FFFFFF",
+            "outline": True,
+            "outline_color": "#000000",
+            "position": "bottom"
+        },
+        "tiktok": {
+            "font": "抖音美好体",
+            "size": 52,
+            "color": "#FFFFFF",
+            "outline": True,
+            "outline_color": "#000000",
+            "position": "center",
+            "animation": "pop"
+        },
+        "karaoke": {
+            "font": "思源黑体",
+            "size": 56,
+            "color": "#FFFF00",
+            "highlight_color": "#FF0000",
+            "position": "bottom",
+            "animation": "highlight"
+        },
+        "minimal": {
+            "font": "苹方",
+            "size": 40,
+            "color": "#FFFFFF",
+            "outline": False,
+            "position": "bottom"
+        },
+    }
+    
+    def __init__(self, ffmpeg_threads: Optional[int] = None):
         super().__init__(agent_id="postprod_agent", agent_name="后期制作代理")
         
+        # FFmpeg 编解码线程数，默认使用全部 CPU
+        self._ffmpeg_threads = ffmpeg_threads or os.cpu_count() or 4
+        
         # 命令处理器映射
         self._command_handlers = {
             "post_produce": self._handle_post_produce,
@@ -40,99 +221,66 @@ class PostProductionAgent(MCPBaseAgent):
             "list_effects": self._handle_list_effects,
         }
         
-        # 支持的转场效果
-        self._transitions = {
-            "fade": {"name": "淡入淡出", "duration": 0.5},
-            "dissolve": {"name": "溶解", "duration": 0.5},
-            "wipe": {"name": "擦除", "duration": 0.3},
-            "slide": {"name": "滑动", "duration": 0.3},
-            "zoom": {"name": "缩放", "duration": 0.4},
-            "spin": {"name": "旋转", "duration": 0.4},
-            "glitch": {"name": "故障风", "duration": 0.2},
-            "flash": {"name": "闪白", "duration": 0.15},
+        # 是否模拟处理耗时（测试和基准时可通过 POSTPROD_SIMULATE=0 或 MCP_MOCK_DELAYS=0 关闭）
+        self._simulate_latency = (
+            self._mock_delays and os.environ.get("POSTPROD_SIMULATE", "1") == "1"
+        )
+        
+        # 批量任务流水线：合成 -> 特效 -> 渲染，有界队列提供背压
+        self._compose_q: asyncio.Queue = asyncio.Queue(maxsize=4)
+        self._effects_q: asyncio.Queue = asyncio.Queue(maxsize=4)
+        self._render_q: asyncio.Queue = asyncio.Queue(maxsize=4)
+        self._pipeline_tasks: List[asyncio.Task] = []
+        # 已提交到流水线、尚未结束的任务，停止时逐个结束，避免调用方永远等待
+        self._pipeline_jobs: Dict[str, Dict[str, Any]] = {}
+        
+        # 预先合并默认样式，查找时只需一次字典访问；结果只读
+        default_style = self._subtitle_styles["default"]
+        self._resolved_styles = {
+            name: MappingProxyType({**default_style, **style})
+            for name, style in self._subtitle_styles.items()
         }
+        self._resolved_style_default = self._resolved_styles["default"]
         
-        # 支持的特效
-        self._effects = {
-            "color_grade": {"name": "调色", "types": ["warm", "cool", "vintage", "cinematic", "vibrant"]},
-            "blur": {"name": "模糊", "types": ["gaussian", "motion", "radial"]},
-            "sharpen": {"name": "锐化", "types": ["standard", "high"]},
-            "vignette": {"name": "暗角", "intensity_range": [0.1, 1.0]},
-            "grain": {"name": "胶片颗粒", "intensity_range": [0.1, 0.5]},
-            "lens_flare": {"name": "镜头光晕", "types": ["sun", "spotlight", "rainbow"]},
-            "glitch": {"name": "故障效果", "intensity_range": [0.1, 0.8]},
-            "slow_motion": {"name": "慢动作", "speed_range": [0.25, 0.75]},
+        # 每种样式的 ASS 文件头只格式化一次，烧录时拼接 Dialogue 行即可
+        self._ass_headers = {
+            name: _style_to_ass(name, style) for name, style in self._resolved_styles.items()
         }
         
-        # 字幕样式
-        self._subtitle_styles = {
-            "default": {
-                "font": "思源黑体",
-                "size": 48,
-                "color": "#FFFFFF",
-                "outline": True,
-                "outline_color": "#000000",
-                "position": "bottom"
-            },
-            "tiktok": {
-                "font": "抖音美好体",
-                "size": 52,
-                "color": "#FFFFFF",
-                "outline": True,
-                "outline_color": "#000000",
-                "position": "center",
-                "animation": "pop"
-            },
-            "karaoke": {
-                "font": "思源黑体",
-                "size": 56,
-                "color": "#FFFF00",
-                "highlight_color": "#FF0000",
-                "position": "bottom",
-                "animation": "highlight"
-            },
-            "minimal": {
-                "font": "苹方",
-                "size": 40,
-                "color": "#FFFFFF",
-                "outline": False,
-                "position": "bottom"
-            },
-        }
+        # 特效目录在初始化后不再变化，只序列化一次；序列化结果与类上的静态表不共享对象
+        self._effects_catalog_json = orjson.dumps({
+            "transitions": self._transitions,
+            "effects": self._effects,
+            "subtitle_styles": self._subtitle_styles
+        })
     
-    async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息"""
-        if not isinstance(message.body, MCPCommand):
-            return message.create_error_response(
-                error_code="INVALID_MESSAGE",
-                error_message="预期收到命令消息"
-            )
-        
-        command = message.body
-        action = command.action
-        
-        self.logger.info(f"收到命令: {action}")
-        
-        handler = self._command_handlers.get(action)
-        if not handler:
-            return message.create_error_response(
-                error_code="UNKNOWN_COMMAND",
-                error_message=f"未知命令: {action}"
-            )
-        
-        try:
-            result = await handler(command.parameters, message.header.session_id)
-            return message.create_response(
-                success=True,
-                message=f"命令 {action} 执行成功",
-                data=result
-            )
-        except Exception as e:
-            self.logger.error(f"执行命令 {action} 时发生错误: {str(e)}", exc_info=True)
-            return message.create_error_response(
-                error_code="EXECUTION_ERROR",
-                error_message=f"执行命令时发生错误: {str(e)}"
-            )
+    async def on_start(self):
+        """启动后期制作流水线工作协程"""
+        self._pipeline_tasks = [
+            asyncio.create_task(self._pipeline_worker("compose", self._compose_q, self._stage_compose, self._effects_q)),
+            asyncio.create_task(self._pipeline_worker("effects", self._effects_q, self._stage_effects, self._render_q)),
+            asyncio.create_task(self._pipeline_worker("render", self._render_q, self._stage_render, None)),
+        ]
+    
+    async def on_stop(self):
+        """停止后期制作流水线工作协程"""
+        for task in self._pipeline_tasks:
+            task.cancel()
+        await asyncio.gather(*self._pipeline_tasks, return_exceptions=True)
+        self._pipeline_tasks = []
+        
+        # 丢弃队列中积压的任务；它们和工作协程取消时正在处理的任务一样，在下面统一结束
+        for queue in (self._compose_q, self._effects_q, self._render_q):
+            while not queue.empty():
+                queue.get_nowait()
+                queue.task_done()
+        
+        for job in list(self._pipeline_jobs.values()):
+            future = job["future"]
+            if not future.done():
+                future.set_exception(RuntimeError("后期制作代理已停止"))
+                job["progress"].put_nowait(None)
+        self._pipeline_jobs.clear()
     
     async def _handle_post_produce(
         self,
@@ -141,37 +289,33 @@ class PostProductionAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """完整的后期制作流程"""
         video = parameters.get("video")
-        audio = parameters.get("audio")
-        script = parameters.get("script")
         effects = parameters.get("effects", ["color_grade", "transitions"])
         subtitles = parameters.get("subtitles", True)
         
         if not video:
             raise ValueError("缺少必要参数: video")
         
-        self.logger.info(f"开始后期制作: 特效={effects}, 字幕={subtitles}")
-        
-        # 步骤1: 合成视频片段
-        composed_video = await self._compose_video_clips(video, session_id)
-        
-        # 步骤2: 添加转场
-        if "transitions" in effects:
-            composed_video = await self._apply_transitions(composed_video, session_id)
-        
-        # 步骤3: 颜色调整
-        if "color_grade" in effects:
-            composed_video = await self._apply_color_grade(composed_video, session_id)
-        
-        # 步骤4: 添加音频
-        if audio:
-            composed_video = await self._add_audio(composed_video, audio, session_id)
+        self.logger.info("开始后期制作: 特效=%s, 字幕=%s", effects, subtitles)
+        
+        job = {
+            "video": video,
+            "audio": parameters.get("audio"),
+            "script": parameters.get("script"),
+            "effects": effects,
+            "subtitles": subtitles,
+            "session_id": session_id,
+            # 一次取够本任务需要的 ID，路径前缀也只拼接一次
+            "ids": secrets.token_hex(8),
+            "temp_dir": _TEMP_ROOT + session_id + "/",
+            "output_dir": _OUTPUT_ROOT + session_id + "/",
+        }
         
-        # 步骤5: 添加字幕
-        if subtitles and script:
-            composed_video = await self._add_subtitles_from_script(composed_video, script, session_id)
+        # 每完成一个阶段广播一次进度，客户端无需等待整个流程结束
+        async for event in self._stream_post_produce(job):
+            if self.is_running:
+                await self.broadcast_event("postprod.progress", event, session_id=session_id)
         
-        # 步骤6: 渲染最终视频
-        final_video = await self._render_final(composed_video, session_id)
+        final_video = job["final"]
         
         return {
             "video_id": final_video["video_id"],
@@ -187,27 +331,184 @@ class PostProductionAgent(MCPBaseAgent):
             }
         }
     
+    async def _stream_post_produce(self, job: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """执行后期制作任务，每完成一个阶段产出一次进度事件"""
+        if not self._pipeline_tasks:
+            # 流水线未启动时直接按顺序执行
+            stages = (
+                ("compose", self._stage_compose),
+                ("effects", self._stage_effects),
+                ("render", self._stage_render),
+            )
+            for stage_name, stage in stages:
+                await stage(job)
+                yield self._progress_event(job, stage_name)
+            return
+        
+        # 交给流水线处理，多个任务可在不同阶段同时进行，工作协程逐阶段回报进度
+        future = asyncio.get_running_loop().create_future()
+        job["future"] = future
+        job["progress"] = asyncio.Queue()
+        self._pipeline_jobs[job["ids"]] = job
+        try:
+            await self._compose_q.put(job)
+            while True:
+                stage_name = await job["progress"].get()
+                if stage_name is None:
+                    # 阶段失败，抛出对应异常
+                    await future
+                    return
+                yield self._progress_event(job, stage_name)
+                if stage_name == "render":
+                    return
+        finally:
+            self._pipeline_jobs.pop(job["ids"], None)
+            # 调用方提前退出时取消任务，工作协程会丢弃它
+            if not future.done():
+                future.cancel()
+    
+    def _progress_event(self, job: Dict[str, Any], stage_name: str) -> Dict[str, Any]:
+        """构建阶段进度事件"""
+        artifact = job["final"] if stage_name == "render" else job["composed"]
+        return {
+            "stage": stage_name,
+            "progress": _STAGE_PROGRESS[stage_name],
+            "artifact": dict(artifact)
+        }
+    
+    async def _simulate_delay(self, low: float, high: float):
+        """模拟处理耗时，取区间中点；关闭模拟时仅让出事件循环"""
+        if self._simulate_latency:
+            await asyncio.sleep((low + high) * 0.5)
+        else:
+            await asyncio.sleep(0)
+    
+    async def _pipeline_worker(
+        self,
+        stage_name: str,
+        queue_in: asyncio.Queue,
+        stage: Callable[[Dict[str, Any]], Awaitable[None]],
+        queue_out: Optional[asyncio.Queue]
+    ):
+        """流水线工作协程：从输入队列取任务，执行本阶段后交给下一阶段"""
+        while True:
+            job = await queue_in.get()
+            future = job["future"]
+            try:
+                if future.done():
+                    # 调用方已取消，丢弃该任务
+                    continue
+                await stage(job)
+                job["progress"].put_nowait(stage_name)
+                if queue_out is not None:
+                    await queue_out.put(job)
+                elif not future.done():
+                    future.set_result(job)
+            except Exception as e:
+                # 任何异常都只结束当前任务，工作协程必须继续运行，否则后续任务会永远等待
+                self.logger.error("流水线阶段 %s 失败: %s", stage_name, e)
+                # 阶段执行期间调用方可能已取消任务
+                if not future.done():
+                    future.set_exception(e)
+                    job["progress"].put_nowait(None)
+            finally:
+                queue_in.task_done()
+    
+    async def _stage_compose(self, job: Dict[str, Any]):
+        """流水线阶段1: 合成视频片段"""
+        job["composed"] = await self._compose_video_clips(
+            job["video"], job["session_id"],
+            composed_id="composed_" + job["ids"][:8], temp_dir=job["temp_dir"]
+        )
+    
+    async def _stage_effects(self, job: Dict[str, Any]):
+        """流水线阶段2: 转场、调色、音频、字幕"""
+        composed_video = job["composed"]
+        effects = job["effects"]
+        audio = job["audio"]
+        script = job["script"]
+        session_id = job["session_id"]
+        
+        # 转场、调色、音频、字幕都只依赖合成结果，
+        # 各自基于一份副本并发处理，完成后合并
+        stages = []
+        if "transitions" in effects:
+            stages.append(self._apply_transitions(dict(composed_video), session_id))
+        if "color_grade" in effects:
+            stages.append(self._apply_color_grade(dict(composed_video), session_id))
+        if audio:
+            stages.append(self._add_audio(dict(composed_video), audio, session_id))
+        if job["subtitles"] and script:
+            stages.append(self._add_subtitles_from_script(dict(composed_video), script, session_id))
+        
+        # 各阶段只追加滤镜片段，按阶段顺序拼成一条滤镜链，渲染时一次完成
+        filters: List[str] = []
+        for stage_result in await asyncio.gather(*stages):
+            filters.extend(stage_result.pop("filters", []))
+            composed_video.update(stage_result)
+        filters.extend(_EFFECT_FILTERS[effect] for effect in effects if effect in _EFFECT_FILTERS)
+        composed_video["filters"] = filters
+    
+    async def _stage_render(self, job: Dict[str, Any]):
+        """流水线阶段3: 渲染最终视频"""
+        job["final"] = await self._render_final(
+            job["composed"], job["session_id"],
+            final_id="final_" + job["ids"][8:], output_dir=job["output_dir"]
+        )
+    
     async def _compose_video_clips(
         self,
         video: Dict[str, Any],
-        session_id: str
+        session_id: str,
+        composed_id: Optional[str] = None,
+        temp_dir: Optional[str] = None
     ) -> Dict[str, Any]:
-        """合成视频片段"""
+        """合成视频片段，片段文件都存在时用 FFmpeg 无损拼接"""
         clips = video.get("clips", [])
         
-        # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 2))
-        
-        composed_id = f"composed_{uuid.uuid4().hex[:8]}"
+        composed_id = composed_id or f"composed_{_short_id()}"
+        temp_dir = temp_dir or _TEMP_ROOT + session_id + "/"
+        file_path = temp_dir + composed_id + ".mp4"
         total_duration = sum(clip.get("duration", 0) for clip in clips)
         
+        if not await self._concat_clips(clips, file_path):
+            # 模拟处理延迟
+            await self._simulate_delay(1, 2)
+        
         return {
             "video_id": composed_id,
             "clips_count": len(clips),
             "duration": total_duration,
-            "file_path": f"/storage/temp/{session_id}/{composed_id}.mp4"
+            "resolution": self._video_resolution(video),
+            "file_path": file_path
         }
     
+    async def _concat_clips(self, clips: List[Dict[str, Any]], output_path: str) -> bool:
+        """系统安装了 FFmpeg 且所有片段文件存在时拼接片段，返回是否实际拼接"""
+        paths = [clip.get("file_path") for clip in clips]
+        if not paths or not all(paths) or not ffmpeg_available():
+            return False
+        for path in paths:
+            if not await aiofiles.os.path.exists(path):
+                return False
+        
+        await asyncio.to_thread(os.makedirs, os.path.dirname(output_path), exist_ok=True)
+        list_path = os.path.splitext(output_path)[0] + ".txt"
+        async with aiofiles.open(list_path, "w", encoding="utf-8") as f:
+            await f.write("".join(f"file {quote_concat_path(os.path.abspath(path))}\n" for path in paths))
+        
+        await run_ffmpeg(build_concat_command(list_path, output_path))
+        self.logger.info("片段拼接完成: %s (%d 个片段)", output_path, len(paths))
+        return True
+    
+    def _video_resolution(self, video: Dict[str, Any]) -> Dict[str, int]:
+        """确定成片分辨率：优先使用片段分辨率，其次按宽高比，默认竖屏"""
+        for clip in video.get("clips", []):
+            if clip.get("resolution"):
+                return dict(clip["resolution"])
+        aspect_ratio = video.get("metadata", {}).get("aspect_ratio", "9:16")
+        return dict(_RENDER_SIZES.get(aspect_ratio, _RENDER_SIZES["9:16"]))
+    
     async def _apply_transitions(
         self,
         video: Dict[str, Any],
@@ -215,10 +516,11 @@ class PostProductionAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """应用转场效果"""
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
+        await self._simulate_delay(0.5, 1)
         
         video["transitions_applied"] = True
         video["transition_type"] = "fade"
+        video["filters"] = ["fade=t=in:st=0:d=0.5"]
         
         return video
     
@@ -229,10 +531,11 @@ class PostProductionAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """应用色彩调整"""
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
+        await self._simulate_delay(0.5, 1)
         
         video["color_graded"] = True
         video["color_preset"] = "cinematic"
+        video["filters"] = ["eq=contrast=1.05:saturation=1.1"]
         
         return video
     
@@ -244,7 +547,7 @@ class PostProductionAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """添加音频"""
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
+        await self._simulate_delay(0.5, 1)
         
         video["audio_added"] = True
         video["audio_path"] = audio.get("mixed", {}).get("file_path")
@@ -259,32 +562,108 @@ class PostProductionAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """从脚本添加字幕"""
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
+        await self._simulate_delay(0.5, 1)
         
+        # 所有场景的旁白生成到同一个 ASS 文件，渲染时一次性烧录
         video["subtitles_added"] = True
         video["subtitle_style"] = "tiktok"
+        video["subtitle_ass"] = self._build_ass(script.get("scenes", []), "tiktok")
         
         return video
     
+    def _build_ass(self, scenes: List[Dict[str, Any]], style_name: str) -> str:
+        """根据脚本场景旁白生成 ASS 字幕内容"""
+        if style_name not in self._ass_headers:
+            style_name = "default"
+        
+        lines = [self._ass_headers[style_name]]
+        current_time = 0.0
+        for scene in scenes:
+            duration = scene.get("duration", 5)
+            narration = scene.get("narration", "")
+            if narration:
+                lines.append(
+                    f"Dialogue: 0,{_ass_time(current_time)},{_ass_time(current_time + duration)},"
+                    f"{style_name},,0,0,0,,{_wrap_subtitle(narration)}\n"
+                )
+            current_time += duration
+        
+        return "".join(lines)
+    
     async def _render_final(
         self,
         video: Dict[str, Any],
-        session_id: str
+        session_id: str,
+        final_id: Optional[str] = None,
+        output_dir: Optional[str] = None
     ) -> Dict[str, Any]:
         """渲染最终视频"""
-        # 模拟渲染延迟
-        await asyncio.sleep(random.uniform(2, 4))
-        
-        final_id = f"final_{uuid.uuid4().hex[:8]}"
+        final_id = final_id or f"final_{_short_id()}"
+        file_path = (output_dir or _OUTPUT_ROOT + session_id + "/") + final_id + ".mp4"
+        # 保持合成视频的分辨率，不同宽高比的项目不会被拉伸
+        resolution = dict(video.get("resolution") or _RENDER_SIZES["9:16"])
+        
+        # 转场、调色、特效和字幕合并为同一条滤镜链，一次解码、一次编码，同时混入音轨
+        encoded = await self._encode(
+            video.get("file_path", ""), file_path, bitrate="8M",
+            width=resolution["width"], height=resolution["height"],
+            filters=video.get("filters"), subtitle_ass=video.get("subtitle_ass"),
+            audio_path=video.get("audio_path")
+        )
+        if encoded:
+            file_size_mb = await aiofiles.os.path.getsize(file_path) / (1024 * 1024)
+        else:
+            # 模拟渲染延迟
+            await self._simulate_delay(2, 4)
+            file_size_mb = _estimate_size_mb("8M", video.get("duration", 60))
         
         return {
             "video_id": final_id,
-            "file_path": f"/storage/output/{session_id}/{final_id}.mp4",
+            "file_path": file_path,
             "duration": video.get("duration", 60),
-            "resolution": {"width": 1080, "height": 1920},
-            "file_size_mb": random.uniform(10, 50)
+            "resolution": resolution,
+            "file_size_mb": file_size_mb
         }
     
+    async def _encode(
+        self,
+        input_path: str,
+        output_path: str,
+        bitrate: Optional[str] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        filters: Optional[List[str]] = None,
+        subtitle_ass: Optional[str] = None,
+        audio_path: Optional[str] = None
+    ) -> bool:
+        """系统安装了 FFmpeg 且输入文件存在时执行真实编码，返回是否实际编码"""
+        if not input_path or not ffmpeg_available():
+            return False
+        if not await aiofiles.os.path.exists(input_path):
+            return False
+        if audio_path and not await aiofiles.os.path.exists(audio_path):
+            self.logger.warning("音频文件不存在，保留原音轨: %s", audio_path)
+            audio_path = None
+        
+        encoder = await select_encoder()
+        await asyncio.to_thread(os.makedirs, os.path.dirname(output_path), exist_ok=True)
+        
+        filters = list(filters or [])
+        if subtitle_ass:
+            # 字幕文件只在真实渲染时写出
+            ass_path = os.path.splitext(output_path)[0] + ".ass"
+            async with aiofiles.open(ass_path, "w", encoding="utf-8") as f:
+                await f.write(subtitle_ass)
+            filters.append(f"subtitles={quote_filter_path(ass_path)}")
+        
+        await run_ffmpeg(build_encode_command(
+            input_path, output_path, encoder,
+            bitrate=bitrate, width=width, height=height, filters=filters,
+            threads=self._ffmpeg_threads, audio_path=audio_path
+        ))
+        self.logger.info("编码完成: %s (编码器=%s)", output_path, encoder.codec)
+        return True
+    
     async def _handle_add_transitions(
         self,
         parameters: Dict[str, Any],
@@ -299,15 +678,15 @@ class PostProductionAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: video_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 2))
+        await self._simulate_delay(1, 2)
         
-        output_id = f"transition_{uuid.uuid4().hex[:8]}"
+        output_id = f"transition_{_short_id()}"
         
         return {
             "video_id": output_id,
             "transition_type": transition_type,
             "transitions_added": len(positions) or "auto",
-            "file_path": f"/storage/temp/{session_id}/{output_id}.mp4"
+            "file_path": f"{_TEMP_ROOT}{session_id}/{output_id}.mp4"
         }
     
     async def _handle_add_subtitles(
@@ -324,17 +703,17 @@ class PostProductionAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: video_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 2))
+        await self._simulate_delay(1, 2)
         
-        output_id = f"subtitled_{uuid.uuid4().hex[:8]}"
-        subtitle_style = self._subtitle_styles.get(style, self._subtitle_styles["default"])
+        output_id = f"subtitled_{_short_id()}"
+        subtitle_style = self._resolved_styles.get(style, self._resolved_style_default)
         
         return {
             "video_id": output_id,
             "subtitles_count": len(subtitles),
             "style": style,
-            "style_settings": subtitle_style,
-            "file_path": f"/storage/temp/{session_id}/{output_id}.mp4"
+            "style_settings": dict(subtitle_style),
+            "file_path": f"{_TEMP_ROOT}{session_id}/{output_id}.mp4"
         }
     
     async def _handle_color_grade(
@@ -351,15 +730,15 @@ class PostProductionAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: video_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 2))
+        await self._simulate_delay(1, 2)
         
-        output_id = f"graded_{uuid.uuid4().hex[:8]}"
+        output_id = f"graded_{_short_id()}"
         
         return {
             "video_id": output_id,
             "preset": preset,
             "adjustments": adjustments,
-            "file_path": f"/storage/temp/{session_id}/{output_id}.mp4"
+            "file_path": f"{_TEMP_ROOT}{session_id}/{output_id}.mp4"
         }
     
     async def _handle_add_effects(
@@ -375,14 +754,14 @@ class PostProductionAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: video_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 3))
+        await self._simulate_delay(1, 3)
         
-        output_id = f"effects_{uuid.uuid4().hex[:8]}"
+        output_id = f"effects_{_short_id()}"
         
         return {
             "video_id": output_id,
             "effects_applied": effects,
-            "file_path": f"/storage/temp/{session_id}/{output_id}.mp4"
+            "file_path": f"{_TEMP_ROOT}{session_id}/{output_id}.mp4"
         }
     
     async def _handle_compose_final(
@@ -399,15 +778,15 @@ class PostProductionAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: video_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(2, 4))
+        await self._simulate_delay(2, 4)
         
-        output_id = f"final_{uuid.uuid4().hex[:8]}"
+        output_id = f"final_{_short_id()}"
         
         return {
             "video_id": output_id,
             "has_audio": audio_path is not None,
             "has_subtitles": subtitle_path is not None,
-            "file_path": f"/storage/output/{session_id}/{output_id}.mp4"
+            "file_path": f"{_OUTPUT_ROOT}{session_id}/{output_id}.mp4"
         }
     
     async def _handle_render_video(
@@ -424,21 +803,23 @@ class PostProductionAgent(MCPBaseAgent):
         if not video_path:
             raise ValueError("缺少必要参数: video_path")
         
-        # 模拟渲染延迟
-        await asyncio.sleep(random.uniform(3, 6))
-        
-        output_id = f"rendered_{uuid.uuid4().hex[:8]}"
+        output_id = f"rendered_{_short_id()}"
+        file_path = f"{_OUTPUT_ROOT}{session_id}/{output_id}.{output_format}"
         
         # 根据质量和分辨率确定比特率
-        bitrates = {
-            ("low", "720p"): "2M",
-            ("medium", "720p"): "4M",
-            ("high", "720p"): "6M",
-            ("low", "1080p"): "4M",
-            ("medium", "1080p"): "8M",
-            ("high", "1080p"): "12M",
-        }
-        bitrate = bitrates.get((quality, resolution), "8M")
+        bitrate = _BITRATES.get((quality, resolution), "8M")
+        
+        # 按目标高度缩放，宽度保持比例
+        encoded = await self._encode(
+            video_path, file_path, bitrate=bitrate,
+            width=-2, height=_RENDER_HEIGHTS.get(resolution)
+        )
+        if encoded:
+            file_size_mb = await aiofiles.os.path.getsize(file_path) / (1024 * 1024)
+        else:
+            # 模拟渲染延迟
+            await self._simulate_delay(3, 6)
+            file_size_mb = _estimate_size_mb(bitrate, parameters.get("duration", 60))
         
         return {
             "video_id": output_id,
@@ -446,8 +827,8 @@ class PostProductionAgent(MCPBaseAgent):
             "quality": quality,
             "resolution": resolution,
             "bitrate": bitrate,
-            "file_path": f"/storage/output/{session_id}/{output_id}.{output_format}",
-            "file_size_mb": random.uniform(10, 100)
+            "file_path": file_path,
+            "file_size_mb": file_size_mb
         }
     
     async def _handle_list_effects(
@@ -455,9 +836,5 @@ class PostProductionAgent(MCPBaseAgent):
         parameters: Dict[str, Any],
         session_id: str
     ) -> Dict[str, Any]:
-        """列出可用的特效"""
-        return {
-            "transitions": self._transitions,
-            "effects": self._effects,
-            "subtitle_styles": self._subtitle_styles
-        }
+        """列出可用的特效，每次从预序列化结果解码出独立副本，调用方修改不影响目录"""
+        return orjson.loads(self._effects_catalog_json)
@@ -4,13 +4,99 @@
 """
 
 import asyncio
-import random
-import uuid
+import copy
+import hashlib
+import os
+import secrets
+import shutil
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from math import fsum
+from operator import itemgetter
+from types import MappingProxyType
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, List,
+                    Optional, Tuple)
+
+import aiofiles.os
+import orjson
 
 from agents.mcp_base_agent import MCPBaseAgent
-from models.mcp import MCPCommand, MCPMessage
+from config import config
+from utils.ffmpeg import (build_encode_command, build_thumbnail_command,
+                          ffmpeg_available, run_ffmpeg, select_encoder)
+from utils.rate_limiter import get_bucket
+
+# 临时文件根目录
+_TEMP_ROOT = "/storage/temp/"
+
+# 支持的视频模型（只读）
+_VIDEO_MODELS = MappingProxyType({
+    "keling": {
+        "name": "可灵视频生成",
+        "description": "支持高质量写实风格视频",
+        "strengths": ["写实风格", "人物生成", "场景一致性"],
+        "max_duration": 10,
+        "supported_styles": ["realistic", "cinematic", "documentary"]
+    },
+    "pika": {
+        "name": "Pika Labs",
+        "description": "擅长创意和艺术风格视频",
+        "strengths": ["创意风格", "艺术效果", "动态转换"],
+        "max_duration": 4,
+        "supported_styles": ["artistic", "creative", "surreal"]
+    },
+    "runway": {
+        "name": "Runway Gen-2",
+        "description": "提供电影级视频质量",
+        "strengths": ["电影质感", "高分辨率", "复杂运动"],
+        "max_duration": 16,
+        "supported_styles": ["cinematic", "professional", "high_quality"]
+    },
+    "wan": {
+        "name": "Wan 动画生成",
+        "description": "专注于动画风格视频",
+        "strengths": ["动画风格", "卡通效果", "角色动画"],
+        "max_duration": 8,
+        "supported_styles": ["anime", "cartoon", "2d_animation"]
+    },
+})
+
+# 分辨率表，按 (宽高比, 质量) 展开为单层只读映射
+_RESOLUTIONS = MappingProxyType({
+    # TikTok/抖音竖屏
+    ("9:16", "low"): {"width": 540, "height": 960},
+    ("9:16", "medium"): {"width": 720, "height": 1280},
+    ("9:16", "high"): {"width": 1080, "height": 1920},
+    # YouTube 横屏
+    ("16:9", "low"): {"width": 854, "height": 480},
+    ("16:9", "medium"): {"width": 1280, "height": 720},
+    ("16:9", "high"): {"width": 1920, "height": 1080},
+    # Instagram 方形
+    ("1:1", "low"): {"width": 480, "height": 480},
+    ("1:1", "medium"): {"width": 720, "height": 720},
+    ("1:1", "high"): {"width": 1080, "height": 1080},
+})
+
+# 超分目标分辨率对应的输出高度，宽度按原始比例自动计算
+_UPSCALE_HEIGHTS = MappingProxyType({
+    "720p": 720,
+    "1080p": 1080,
+    "1440p": 1440,
+    "4k": 2160,
+})
+
+
+def _link_file(src: str, dst: str):
+    """
+    将已生成的文件链接到新路径，不复制内容
+    
+    使用硬链接，源会话清理临时文件后链接仍然有效；跨文件系统时退回复制
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 
 class VisualAgent(MCPBaseAgent):
@@ -24,12 +110,20 @@ class VisualAgent(MCPBaseAgent):
     4. 生成缩略图和预览图
     """
     
+    # 支持的视频模型（只读，供 set_model 等内部查找使用）
+    _video_models = _VIDEO_MODELS
+    
+    # 模型目录只序列化一次，list_models 和 /api/models/video 每次反序列化出独立副本，
+    # 调用方修改返回值不会影响模型表
+    _video_models_json = orjson.dumps(dict(_VIDEO_MODELS))
+    
     def __init__(self):
         super().__init__(agent_id="visual_agent", agent_name="视觉生成代理")
         
         # 命令处理器映射
         self._command_handlers = {
             "generate_video": self._handle_generate_video,
+            "generate_video_stream": self._handle_generate_video_stream,
             "generate_scene": self._handle_generate_scene,
             "image_to_video": self._handle_image_to_video,
             "generate_thumbnail": self._handle_generate_thumbnail,
@@ -37,74 +131,15 @@ class VisualAgent(MCPBaseAgent):
             "list_models": self._handle_list_models,
         }
         
-        # 支持的视频模型
-        self._video_models = {
-            "keling": {
-                "name": "可灵视频生成",
-                "description": "支持高质量写实风格视频",
-                "strengths": ["写实风格", "人物生成", "场景一致性"],
-                "max_duration": 10,
-                "supported_styles": ["realistic", "cinematic", "documentary"]
-            },
-            "pika": {
-                "name": "Pika Labs",
-                "description": "擅长创意和艺术风格视频",
-                "strengths": ["创意风格", "艺术效果", "动态转换"],
-                "max_duration": 4,
-                "supported_styles": ["artistic", "creative", "surreal"]
-            },
-            "runway": {
-                "name": "Runway Gen-2",
-                "description": "提供电影级视频质量",
-                "strengths": ["电影质感", "高分辨率", "复杂运动"],
-                "max_duration": 16,
-                "supported_styles": ["cinematic", "professional", "high_quality"]
-            },
-            "wan": {
-                "name": "Wan 动画生成",
-                "description": "专注于动画风格视频",
-                "strengths": ["动画风格", "卡通效果", "角色动画"],
-                "max_duration": 8,
-                "supported_styles": ["anime", "cartoon", "2d_animation"]
-            },
-        }
-        
         # 当前使用的模型
         self._current_model = "keling"
-    
-    async def handle_command(self, message: MCPMessage) -> Optional[MCPMessage]:
-        """处理命令消息"""
-        if not isinstance(message.body, MCPCommand):
-            return message.create_error_response(
-                error_code="INVALID_MESSAGE",
-                error_message="预期收到命令消息"
-            )
-        
-        command = message.body
-        action = command.action
-        
-        self.logger.info(f"收到命令: {action}")
         
-        handler = self._command_handlers.get(action)
-        if not handler:
-            return message.create_error_response(
-                error_code="UNKNOWN_COMMAND",
-                error_message=f"未知命令: {action}"
-            )
+        # 场景生成并发上限，避免同时向模型服务发起过多请求
+        self._generation_semaphore = asyncio.Semaphore(config.agent.max_concurrent_tasks)
         
-        try:
-            result = await handler(command.parameters, message.header.session_id)
-            return message.create_response(
-                success=True,
-                message=f"命令 {action} 执行成功",
-                data=result
-            )
-        except Exception as e:
-            self.logger.error(f"执行命令 {action} 时发生错误: {str(e)}", exc_info=True)
-            return message.create_error_response(
-                error_code="EXECUTION_ERROR",
-                error_message=f"执行命令时发生错误: {str(e)}"
-            )
+        # 生成结果缓存（LRU，键为生成参数的哈希）
+        self._result_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._result_cache_max_entries = 256
     
     async def _handle_generate_video(
         self,
@@ -112,6 +147,63 @@ class VisualAgent(MCPBaseAgent):
         session_id: str
     ) -> Dict[str, Any]:
         """根据脚本生成完整视频"""
+        return await self._generate_video(parameters, session_id)
+    
+    async def _handle_generate_video_stream(
+        self,
+        parameters: Dict[str, Any],
+        session_id: str
+    ) -> Dict[str, Any]:
+        """根据脚本生成完整视频，每个片段完成时立即广播 video.clip_generated 事件"""
+        async def on_clip(index: int, total: int, clip: Dict[str, Any]):
+            await self.broadcast_event(
+                "video.clip_generated",
+                {"index": index, "total": total, "clip": clip},
+                session_id=session_id
+            )
+        
+        return await self._generate_video(parameters, session_id, on_clip=on_clip)
+    
+    async def _generate_video(
+        self,
+        parameters: Dict[str, Any],
+        session_id: str,
+        on_clip: Optional[Callable[[int, int, Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        生成完整视频，generate_video 和 generate_video_stream 共用
+        
+        Args:
+            parameters: 视频生成请求参数
+            session_id: 会话ID
+            on_clip: 每个片段完成时调用的回调，参数为 (场景序号, 场景总数, 片段)
+        """
+        request = self._parse_video_request(parameters)
+        scenes = request.pop("scenes")
+        per_scene_timeout = request.pop("per_scene_timeout")
+        
+        # 会话输出目录只计算一次
+        output_dir = self._temp_dir(session_id)
+        
+        # 按完成顺序消费片段并立即放回原位，已完成的生成任务无需等到最后一个场景结束
+        slots: List[Optional[Dict[str, Any]]] = [None] * len(scenes)
+        stream = self._generate_scene_videos_stream(
+            scenes, per_scene_timeout, output_dir=output_dir,
+            **self._scene_generation_params(request)
+        )
+        async for index, clip in stream:
+            slots[index] = clip
+            if on_clip is not None:
+                await on_clip(index, len(scenes), clip)
+        
+        video_clips = [clip for clip in slots if clip is not None]
+        skipped_scenes = [
+            scene.get("scene_id", 0) for scene, clip in zip(scenes, slots) if clip is None
+        ]
+        return self._build_video_result(video_clips, skipped_scenes, request)
+    
+    def _parse_video_request(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """解析并校验视频生成请求参数"""
         script = parameters.get("script")
         style = parameters.get("style", "realistic")
         aspect_ratio = parameters.get("aspect_ratio", "9:16")
@@ -121,106 +213,250 @@ class VisualAgent(MCPBaseAgent):
         if not script:
             raise ValueError("缺少必要参数: script")
         
-        self.logger.info(f"开始生成视频: 风格={style}, 比例={aspect_ratio}, 模型={model}")
+        self.logger.info("开始生成视频: 风格=%s, 比例=%s, 模型=%s", style, aspect_ratio, model)
         
         # 获取场景列表
         scenes = script.get("scenes", [])
         if not scenes:
             raise ValueError("脚本中没有场景")
         
-        # 生成每个场景的视频片段
-        video_clips = []
-        for scene in scenes:
-            clip = await self._generate_scene_video(
-                scene=scene,
-                style=style,
-                aspect_ratio=aspect_ratio,
-                quality=quality,
-                model=model,
-                session_id=session_id
-            )
-            video_clips.append(clip)
+        return {
+            "scenes": scenes,
+            "per_scene_timeout": parameters.get("per_scene_timeout"),
+            "style": style,
+            "aspect_ratio": aspect_ratio,
+            "quality": quality,
+            "model": model,
+            "ignore_cache": parameters.get("ignore_cache", False),
+            "seed": parameters.get("seed"),
+        }
+    
+    def _scene_generation_params(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """提取单场景生成参数，分辨率在整个请求内只解析一次"""
+        return {
+            "style": request["style"],
+            "resolution": self._get_resolution(request["aspect_ratio"], request["quality"]),
+            "model": request["model"],
+            "ignore_cache": request["ignore_cache"],
+            "seed": request["seed"],
+        }
+    
+    def _build_video_result(
+        self,
+        video_clips: List[Dict[str, Any]],
+        skipped_scenes: List[Any],
+        request: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """汇总片段生成视频结果"""
+        if not video_clips:
+            raise ValueError("所有场景均生成超时")
         
         # 生成视频 ID
-        video_id = f"video_{uuid.uuid4().hex[:8]}"
+        video_id = f"video_{secrets.token_hex(4)}"
         
         return {
             "video_id": video_id,
             "clips": video_clips,
             "metadata": {
-                "style": style,
-                "aspect_ratio": aspect_ratio,
-                "quality": quality,
-                "model": model,
+                "style": request["style"],
+                "aspect_ratio": request["aspect_ratio"],
+                "quality": request["quality"],
+                "model": request["model"],
                 "total_clips": len(video_clips),
-                "total_duration": sum(clip["duration"] for clip in video_clips),
+                "skipped_scenes": skipped_scenes,
+                "total_duration": fsum(map(itemgetter("duration"), video_clips)),
                 "created_at": datetime.now().isoformat()
             }
         }
     
+    async def _generate_scene_videos_stream(
+        self,
+        scenes: List[Dict[str, Any]],
+        per_scene_timeout: Optional[float] = None,
+        **kwargs
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """并发生成场景片段，按完成顺序产出 (场景序号, 片段)"""
+        async def run(indices: List[int]):
+            clip = await self._generate_scene_bounded(
+                scenes[indices[0]], per_scene_timeout, **kwargs
+            )
+            return indices, clip
+        
+        tasks = [asyncio.create_task(run(indices)) for indices in self._group_scenes(scenes)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indices, clip = await next_done
+                if clip is None:
+                    continue
+                for index, scene_clip in await self._expand_clip(scenes, indices, clip):
+                    yield index, scene_clip
+        finally:
+            # 消费方提前退出时取消剩余任务
+            for task in tasks:
+                task.cancel()
+    
+    def _group_scenes(self, scenes: List[Dict[str, Any]]) -> List[List[int]]:
+        """将内容相同的场景合并，返回每组场景的序号列表；没有提示词的场景各自生成"""
+        groups: Dict[Any, List[int]] = {}
+        for index, scene in enumerate(scenes):
+            key = self._scene_key(scene)
+            groups.setdefault(index if key is None else key, []).append(index)
+        return list(groups.values())
+    
+    async def _expand_clip(
+        self,
+        scenes: List[Dict[str, Any]],
+        indices: List[int],
+        clip: Dict[str, Any]
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """将一组场景共享的生成结果展开到每个场景，重复场景使用独立的片段 ID 并覆盖 scene_id"""
+        expanded = [(indices[0], clip)]
+        output_dir = os.path.dirname(clip["file_path"]) + "/"
+        for index in indices[1:]:
+            duplicate = await self._reuse_clip(clip, output_dir)
+            duplicate["scene_id"] = scenes[index].get("scene_id", 0)
+            expanded.append((index, duplicate))
+        return expanded
+    
+    async def _generate_scene_bounded(
+        self,
+        scene: Dict[str, Any],
+        per_scene_timeout: Optional[float] = None,
+        **kwargs
+    ) -> Optional[Dict[str, Any]]:
+        """带超时生成单个场景，超时返回 None"""
+        # 单个场景超时不拖住整个请求，记录后跳过
+        timeout = per_scene_timeout or max(30.0, scene.get("duration", 5) * 10)
+        try:
+            # 限制同时进行的生成数量，排队时间不计入超时
+            async with self._generation_semaphore:
+                return await asyncio.wait_for(
+                    self._generate_scene_video(scene=scene, **kwargs),
+                    timeout=timeout
+                )
+        except asyncio.TimeoutError:
+            self.logger.error("生成场景 %s 超时 (%ss)", scene.get("scene_id", 0), timeout)
+            return None
+    
     async def _generate_scene_video(
         self,
         scene: Dict[str, Any],
         style: str,
-        aspect_ratio: str,
-        quality: str,
+        resolution: Dict[str, int],
         model: str,
-        session_id: str = "default"
+        output_dir: str = _TEMP_ROOT + "default/",
+        ignore_cache: bool = False,
+        seed: Optional[int] = None
     ) -> Dict[str, Any]:
-        """生成单个场景的视频片段"""
+        """生成单个场景的视频片段，未指定 seed 时随机生成"""
         scene_id = scene.get("scene_id", 0)
         duration = scene.get("duration", 5)
         visual_prompt = scene.get("visual_prompt", "")
         description = scene.get("description", "")
         
+        # 只有指定 seed 时生成结果可复现，才使用缓存；未指定时每次都重新随机生成
+        cache_key = None
+        if seed is not None:
+            cache_key = self._cache_key({
+                "kind": "scene_video",
+                "model": model,
+                "prompt": visual_prompt or description,
+                "duration": duration,
+                "resolution": resolution,
+                "style": style,
+                "seed": seed,
+            })
+            cached = None if ignore_cache else self._cache_get(cache_key)
+            if cached is not None:
+                clip = await self._reuse_clip(cached, output_dir)
+                clip["scene_id"] = scene_id
+                return clip
+        
+        # 调用模型服务前获取限流令牌，缓存命中时不消耗
+        await get_bucket(model).acquire()
+        
         # 模拟视频生成延迟（实际会调用外部 API）
-        await asyncio.sleep(random.uniform(0.5, 1.5))
+        await self._simulate_delay(0.5, 1.5)
         
         # 生成模拟的视频数据
-        clip_id = f"clip_{uuid.uuid4().hex[:8]}"
+        clip_id = f"clip_{secrets.token_hex(4)}"
         
-        # 模拟生成参数
-        resolution = self._get_resolution(aspect_ratio, quality)
-        
-        return {
+        clip = {
             "clip_id": clip_id,
             "scene_id": scene_id,
             "duration": duration,
-            "resolution": resolution,
+            "resolution": dict(resolution),
             "fps": 30,
             "format": "mp4",
-            "file_path": f"/storage/temp/{session_id}/{clip_id}.mp4",
+            "file_path": output_dir + clip_id + ".mp4",
             "generation_params": {
                 "prompt": visual_prompt or description,
                 "style": style,
                 "model": model,
-                "seed": random.randint(1, 999999)
+                "seed": seed if seed is not None else self._rng.randint(1, 999999)
             },
             "status": "generated"
         }
+        if cache_key is not None:
+            self._cache_put(cache_key, clip)
+        return clip
+    
+    async def _reuse_clip(self, clip: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+        """
+        复用已生成的片段，分配新的片段 ID，文件路径位于调用方的输出目录
+        
+        源文件存在时链接到新路径，各会话的临时文件互不影响
+        """
+        clip_id = f"clip_{secrets.token_hex(4)}"
+        reused = copy.copy(clip)
+        reused["clip_id"] = clip_id
+        reused["file_path"] = output_dir + clip_id + ".mp4"
+        if await aiofiles.os.path.exists(clip["file_path"]):
+            await asyncio.to_thread(_link_file, clip["file_path"], reused["file_path"])
+        return reused
+    
+    def _scene_key(self, scene: Dict[str, Any]) -> Optional[tuple]:
+        """场景去重键（同一请求内风格、模型和分辨率相同），没有提示词时返回 None 不参与去重"""
+        prompt = scene.get("visual_prompt", "") or scene.get("description", "")
+        if not prompt:
+            return None
+        return (prompt, scene.get("duration", 5))
+    
+    def _cache_key(self, params: Dict[str, Any]) -> str:
+        """根据生成参数计算缓存键"""
+        payload = orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存结果，命中时返回副本"""
+        entry = self._result_cache.get(key)
+        if entry is None:
+            return None
+        self._result_cache.move_to_end(key)
+        return copy.deepcopy(entry)
+    
+    def _cache_put(self, key: str, result: Dict[str, Any]):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._result_cache[key] = copy.deepcopy(result)
+        self._result_cache.move_to_end(key)
+        if len(self._result_cache) > self._result_cache_max_entries:
+            self._result_cache.popitem(last=False)
+    
+    def _temp_dir(self, session_id: str) -> str:
+        """获取会话的临时文件目录"""
+        return _TEMP_ROOT + session_id + "/"
     
     def _get_resolution(self, aspect_ratio: str, quality: str) -> Dict[str, int]:
         """根据宽高比和质量获取分辨率"""
-        resolutions = {
-            "9:16": {  # TikTok/抖音竖屏
-                "low": {"width": 540, "height": 960},
-                "medium": {"width": 720, "height": 1280},
-                "high": {"width": 1080, "height": 1920}
-            },
-            "16:9": {  # YouTube 横屏
-                "low": {"width": 854, "height": 480},
-                "medium": {"width": 1280, "height": 720},
-                "high": {"width": 1920, "height": 1080}
-            },
-            "1:1": {  # Instagram 方形
-                "low": {"width": 480, "height": 480},
-                "medium": {"width": 720, "height": 720},
-                "high": {"width": 1080, "height": 1080}
-            }
-        }
-        
-        ratio_resolutions = resolutions.get(aspect_ratio, resolutions["9:16"])
-        return ratio_resolutions.get(quality, ratio_resolutions["medium"])
+        resolution = _RESOLUTIONS.get((aspect_ratio, quality))
+        if resolution is None:
+            # 未知宽高比回退到竖屏，未知质量回退到 medium
+            if (aspect_ratio, "medium") not in _RESOLUTIONS:
+                aspect_ratio = "9:16"
+            resolution = _RESOLUTIONS.get(
+                (aspect_ratio, quality), _RESOLUTIONS[(aspect_ratio, "medium")]
+            )
+        return dict(resolution)
     
     async def _handle_generate_scene(
         self,
@@ -232,24 +468,49 @@ class VisualAgent(MCPBaseAgent):
         duration = parameters.get("duration", 5)
         style = parameters.get("style", "realistic")
         model = parameters.get("model", self._current_model)
+        ignore_cache = parameters.get("ignore_cache", False)
+        seed = parameters.get("seed")
         
         if not prompt:
             raise ValueError("缺少必要参数: prompt")
         
+        output_dir = self._temp_dir(session_id)
+        
+        # 只有指定 seed 时才使用缓存，命中时在本会话目录下返回新的片段
+        cache_key = None
+        if seed is not None:
+            cache_key = self._cache_key({
+                "kind": "scene",
+                "model": model,
+                "prompt": prompt,
+                "duration": duration,
+                "style": style,
+                "seed": seed,
+            })
+            cached = None if ignore_cache else self._cache_get(cache_key)
+            if cached is not None:
+                return await self._reuse_clip(cached, output_dir)
+        
+        await get_bucket(model).acquire()
+        
         # 模拟生成延迟
-        await asyncio.sleep(random.uniform(2, 4))
+        await self._simulate_delay(2, 4)
         
-        clip_id = f"clip_{uuid.uuid4().hex[:8]}"
+        clip_id = f"clip_{secrets.token_hex(4)}"
         
-        return {
+        result = {
             "clip_id": clip_id,
             "duration": duration,
             "prompt": prompt,
             "style": style,
             "model": model,
-            "file_path": f"/storage/temp/{session_id}/{clip_id}.mp4",
+            "seed": seed if seed is not None else self._rng.randint(1, 999999),
+            "file_path": output_dir + clip_id + ".mp4",
             "status": "generated"
         }
+        if cache_key is not None:
+            self._cache_put(cache_key, result)
+        return result
     
     async def _handle_image_to_video(
         self,
@@ -265,16 +526,16 @@ class VisualAgent(MCPBaseAgent):
             raise ValueError("缺少必要参数: image_path")
         
         # 模拟处理延迟
-        await asyncio.sleep(random.uniform(1, 3))
+        await self._simulate_delay(1, 3)
         
-        video_id = f"video_{uuid.uuid4().hex[:8]}"
+        video_id = f"video_{secrets.token_hex(4)}"
         
         return {
             "video_id": video_id,
             "source_image": image_path,
             "motion_type": motion_type,
             "duration": duration,
-            "file_path": f"/storage/temp/{session_id}/{video_id}.mp4",
+            "file_path": self._temp_dir(session_id) + video_id + ".mp4",
             "status": "converted"
         }
     
@@ -291,17 +552,27 @@ class VisualAgent(MCPBaseAgent):
         if not video_path:
             raise ValueError("缺少必要参数: video_path")
         
-        # 模拟处理延迟
-        await asyncio.sleep(random.uniform(0.5, 1))
-        
-        thumbnail_id = f"thumb_{uuid.uuid4().hex[:8]}"
+        thumbnail_id = f"thumb_{secrets.token_hex(4)}"
+        file_path = self._temp_dir(session_id) + thumbnail_id + ".jpg"
+        dimensions = {"width": 1080, "height": 1920}
+        
+        if ffmpeg_available() and await aiofiles.os.path.exists(video_path):
+            # 真实截帧：FFmpeg 以异步子进程运行，不阻塞事件循环
+            await asyncio.to_thread(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+            await run_ffmpeg(build_thumbnail_command(
+                video_path, file_path, timestamp,
+                width=dimensions["width"], height=dimensions["height"]
+            ))
+        else:
+            # 模拟处理延迟
+            await self._simulate_delay(0.5, 1)
         
         return {
             "thumbnail_id": thumbnail_id,
             "source_video": video_path,
             "timestamp": timestamp,
-            "file_path": f"/storage/temp/{session_id}/{thumbnail_id}.jpg",
-            "dimensions": {"width": 1080, "height": 1920},
+            "file_path": file_path,
+            "dimensions": dimensions,
             "status": "generated"
         }
     
@@ -317,16 +588,28 @@ class VisualAgent(MCPBaseAgent):
         if not video_path:
             raise ValueError("缺少必要参数: video_path")
         
-        # 模拟处理延迟
-        await asyncio.sleep(random.uniform(3, 6))
+        # 未知目标分辨率无法换算输出高度，按原有方式模拟处理
+        height = _UPSCALE_HEIGHTS.get(target_resolution)
+        
+        upscaled_id = f"upscaled_{secrets.token_hex(4)}"
+        file_path = self._temp_dir(session_id) + upscaled_id + ".mp4"
         
-        upscaled_id = f"upscaled_{uuid.uuid4().hex[:8]}"
+        if height is not None and ffmpeg_available() and await aiofiles.os.path.exists(video_path):
+            # 真实超分：FFmpeg 以异步子进程运行，长时间编码期间代理仍可处理其他消息
+            await asyncio.to_thread(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+            await run_ffmpeg(build_encode_command(
+                video_path, file_path, await select_encoder(),
+                filters=[f"scale=-2:{height}:flags=lanczos"]
+            ))
+        else:
+            # 模拟处理延迟
+            await self._simulate_delay(3, 6)
         
         return {
             "video_id": upscaled_id,
             "source_video": video_path,
             "target_resolution": target_resolution,
-            "file_path": f"/storage/temp/{session_id}/{upscaled_id}.mp4",
+            "file_path": file_path,
             "status": "upscaled"
         }
     
@@ -337,7 +620,7 @@ class VisualAgent(MCPBaseAgent):
     ) -> Dict[str, Any]:
         """列出可用的视频模型"""
         return {
-            "models": self._video_models,
+            "models": orjson.loads(self._video_models_json),
             "current_model": self._current_model
         }
     
@@ -345,6 +628,6 @@ class VisualAgent(MCPBaseAgent):
         """设置当前使用的模型"""
         if model in self._video_models:
             self._current_model = model
-            self.logger.info(f"切换到视频模型: {model}")
+            self.logger.info("切换到视频模型: %s", model)
         else:
             raise ValueError(f"不支持的模型: {model}")
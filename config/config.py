@@ -4,15 +4,45 @@
 """
 
 import os
+import sys
 from dataclasses import dataclass, field
+from operator import attrgetter
+from types import MappingProxyType
 from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+# .env 在每个进程中只解析一次；直接注入环境变量的部署可设置 MCP_SKIP_DOTENV=1 跳过文件读取
+_DOTENV_LOADED = False
 
 
-@dataclass
+def _load_env_once():
+    """加载 .env 文件（幂等），已存在的环境变量不会被覆盖"""
+    global _DOTENV_LOADED
+    if _DOTENV_LOADED:
+        return
+    if not os.environ.get("MCP_SKIP_DOTENV"):
+        load_dotenv(override=False)
+    _DOTENV_LOADED = True
+
+
+_load_env_once()
+
+# 环境变量只读快照，导入时生成一次，配置读取均为普通字典查找
+_ENV = MappingProxyType(dict(os.environ))
+
+
+def reload_env() -> MappingProxyType:
+    """重新生成环境变量快照，之后调用 SystemConfig.from_env() 即可读到新值"""
+    global _ENV
+    _ENV = MappingProxyType(dict(os.environ))
+    return _ENV
+
+
+# Python 3.10+ 的配置数据类使用 __slots__，省去实例 __dict__ 并加快属性访问
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class VideoModelConfig:
     """视频生成模型配置"""
     name: str
@@ -21,9 +51,10 @@ class VideoModelConfig:
     default_params: Dict[str, Any] = field(default_factory=dict)
     enabled: bool = True
     priority: int = 1  # 优先级，数字越小优先级越高
+    requests_per_minute: int = 60  # 服务商限流（每分钟请求数）
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class VoiceModelConfig:
     """语音合成模型配置"""
     name: str
@@ -32,9 +63,10 @@ class VoiceModelConfig:
     default_params: Dict[str, Any] = field(default_factory=dict)
     enabled: bool = True
     priority: int = 1
+    requests_per_minute: int = 60
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class MusicModelConfig:
     """音乐生成模型配置"""
     name: str
@@ -43,9 +75,10 @@ class MusicModelConfig:
     default_params: Dict[str, Any] = field(default_factory=dict)
     enabled: bool = True
     priority: int = 1
+    requests_per_minute: int = 60
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class EditingToolConfig:
     """视频编辑工具配置"""
     name: str
@@ -54,9 +87,10 @@ class EditingToolConfig:
     default_params: Dict[str, Any] = field(default_factory=dict)
     enabled: bool = True
     priority: int = 1
+    requests_per_minute: int = 60
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ModelConfig:
     """所有模型配置"""
     video_models: List[VideoModelConfig] = field(default_factory=list)
@@ -64,28 +98,41 @@ class ModelConfig:
     music_models: List[MusicModelConfig] = field(default_factory=list)
     editing_tools: List[EditingToolConfig] = field(default_factory=list)
     
+    # 首选模型查询缓存（模型列表加载后基本不变，修改后调用 invalidate_cache 失效）
+    _preferred_cache: Dict[str, Any] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    
+    def _get_preferred(self, kind: str, models: List[Any]) -> Optional[Any]:
+        """获取已启用且优先级最高的配置，结果按类别缓存"""
+        if kind not in self._preferred_cache:
+            self._preferred_cache[kind] = min(
+                (m for m in models if m.enabled), key=attrgetter("priority"), default=None
+            )
+        return self._preferred_cache[kind]
+    
+    def invalidate_cache(self):
+        """清空首选模型缓存"""
+        self._preferred_cache.clear()
+    
     def get_preferred_video_model(self) -> Optional[VideoModelConfig]:
         """获取首选视频模型"""
-        enabled_models = [m for m in self.video_models if m.enabled]
-        return sorted(enabled_models, key=lambda x: x.priority)[0] if enabled_models else None
+        return self._get_preferred("video", self.video_models)
     
     def get_preferred_voice_model(self) -> Optional[VoiceModelConfig]:
         """获取首选语音模型"""
-        enabled_models = [m for m in self.voice_models if m.enabled]
-        return sorted(enabled_models, key=lambda x: x.priority)[0] if enabled_models else None
+        return self._get_preferred("voice", self.voice_models)
     
     def get_preferred_music_model(self) -> Optional[MusicModelConfig]:
         """获取首选音乐模型"""
-        enabled_models = [m for m in self.music_models if m.enabled]
-        return sorted(enabled_models, key=lambda x: x.priority)[0] if enabled_models else None
+        return self._get_preferred("music", self.music_models)
     
     def get_preferred_editing_tool(self) -> Optional[EditingToolConfig]:
         """获取首选编辑工具"""
-        enabled_tools = [t for t in self.editing_tools if t.enabled]
-        return sorted(enabled_tools, key=lambda x: x.priority)[0] if enabled_tools else None
+        return self._get_preferred("editing", self.editing_tools)
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class AgentConfig:
     """代理配置"""
     heartbeat_interval: int = 10  # 心跳间隔（秒）
@@ -95,7 +142,7 @@ class AgentConfig:
     max_concurrent_tasks: int = 5  # 最大并发任务数
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class MessageBusConfig:
     """消息总线配置"""
     max_history_size: int = 1000  # 最大历史消息数量
@@ -104,7 +151,7 @@ class MessageBusConfig:
     default_message_ttl: int = 300  # 默认消息存活时间（秒）
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class WorkflowConfig:
     """工作流配置"""
     default_video_duration: float = 60.0  # 默认视频时长（秒）
@@ -116,7 +163,7 @@ class WorkflowConfig:
     ])
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ServerConfig:
     """服务器配置"""
     host: str = "0.0.0.0"
@@ -124,9 +171,11 @@ class ServerConfig:
     ui_port: int = 8080
     debug: bool = False
     cors_origins: List[str] = field(default_factory=lambda: ["*"])
+    create_video_rate_limit: int = 30  # 每个客户端 IP 每 5 分钟最多发起的创建视频请求数
+    max_inflight_commands: int = 32  # API 同时发往中央代理的最大命令数
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class StorageConfig:
     """存储配置"""
     base_path: str = "./storage"
@@ -138,7 +187,7 @@ class StorageConfig:
     cleanup_after_days: int = 7  # 自动清理天数
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class SystemConfig:
     """系统总配置"""
     models: ModelConfig = field(default_factory=ModelConfig)
@@ -148,38 +197,44 @@ class SystemConfig:
     server: ServerConfig = field(default_factory=ServerConfig)
     storage: StorageConfig = field(default_factory=StorageConfig)
     
+    # 可用模型查询缓存，update 时失效
+    _available_cache: Dict[str, tuple] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    
     @classmethod
     def from_env(cls) -> "SystemConfig":
-        """从环境变量加载配置"""
+        """从环境变量加载配置（读取模块级快照，环境变量变化后先调用 reload_env）"""
+        env = _ENV
         config = cls()
         
         # 加载视频模型配置
         config.models.video_models = [
             VideoModelConfig(
                 name="keling",
-                api_key=os.getenv("KELING_API_KEY"),
-                endpoint=os.getenv("KELING_ENDPOINT", "https://api.keling.ai"),
+                api_key=env.get("KELING_API_KEY"),
+                endpoint=env.get("KELING_ENDPOINT", "https://api.keling.ai"),
                 default_params={"quality": "high", "style": "realistic"},
                 priority=1
             ),
             VideoModelConfig(
                 name="pika",
-                api_key=os.getenv("PIKA_API_KEY"),
-                endpoint=os.getenv("PIKA_ENDPOINT", "https://api.pika.art"),
+                api_key=env.get("PIKA_API_KEY"),
+                endpoint=env.get("PIKA_ENDPOINT", "https://api.pika.art"),
                 default_params={"style": "creative"},
                 priority=2
             ),
             VideoModelConfig(
                 name="runway",
-                api_key=os.getenv("RUNWAY_API_KEY"),
-                endpoint=os.getenv("RUNWAY_ENDPOINT", "https://api.runwayml.com"),
+                api_key=env.get("RUNWAY_API_KEY"),
+                endpoint=env.get("RUNWAY_ENDPOINT", "https://api.runwayml.com"),
                 default_params={"quality": "cinematic"},
                 priority=3
             ),
             VideoModelConfig(
                 name="wan",
-                api_key=os.getenv("WAN_API_KEY"),
-                endpoint=os.getenv("WAN_ENDPOINT", "https://api.wan.ai"),
+                api_key=env.get("WAN_API_KEY"),
+                endpoint=env.get("WAN_ENDPOINT", "https://api.wan.ai"),
                 default_params={"style": "anime"},
                 priority=4
             ),
@@ -189,22 +244,22 @@ class SystemConfig:
         config.models.voice_models = [
             VoiceModelConfig(
                 name="elevenlabs",
-                api_key=os.getenv("ELEVENLABS_API_KEY"),
-                endpoint=os.getenv("ELEVENLABS_ENDPOINT", "https://api.elevenlabs.io"),
+                api_key=env.get("ELEVENLABS_API_KEY"),
+                endpoint=env.get("ELEVENLABS_ENDPOINT", "https://api.elevenlabs.io"),
                 default_params={"voice_id": "default", "stability": 0.75},
                 priority=1
             ),
             VoiceModelConfig(
                 name="playht",
-                api_key=os.getenv("PLAYHT_API_KEY"),
-                endpoint=os.getenv("PLAYHT_ENDPOINT", "https://api.play.ht"),
+                api_key=env.get("PLAYHT_API_KEY"),
+                endpoint=env.get("PLAYHT_ENDPOINT", "https://api.play.ht"),
                 default_params={"quality": "high"},
                 priority=2
             ),
             VoiceModelConfig(
                 name="tencent",
-                api_key=os.getenv("TENCENT_API_KEY"),
-                endpoint=os.getenv("TENCENT_ENDPOINT", "https://tts.cloud.tencent.com"),
+                api_key=env.get("TENCENT_API_KEY"),
+                endpoint=env.get("TENCENT_ENDPOINT", "https://tts.cloud.tencent.com"),
                 default_params={"language": "zh-CN"},
                 priority=3
             ),
@@ -214,22 +269,22 @@ class SystemConfig:
         config.models.music_models = [
             MusicModelConfig(
                 name="suno",
-                api_key=os.getenv("SUNO_API_KEY"),
-                endpoint=os.getenv("SUNO_ENDPOINT", "https://api.suno.ai"),
+                api_key=env.get("SUNO_API_KEY"),
+                endpoint=env.get("SUNO_ENDPOINT", "https://api.suno.ai"),
                 default_params={"duration": 60},
                 priority=1
             ),
             MusicModelConfig(
                 name="aiva",
-                api_key=os.getenv("AIVA_API_KEY"),
-                endpoint=os.getenv("AIVA_ENDPOINT", "https://api.aiva.ai"),
+                api_key=env.get("AIVA_API_KEY"),
+                endpoint=env.get("AIVA_ENDPOINT", "https://api.aiva.ai"),
                 default_params={"mood": "upbeat"},
                 priority=2
             ),
             MusicModelConfig(
                 name="soundraw",
-                api_key=os.getenv("SOUNDRAW_API_KEY"),
-                endpoint=os.getenv("SOUNDRAW_ENDPOINT", "https://api.soundraw.io"),
+                api_key=env.get("SOUNDRAW_API_KEY"),
+                endpoint=env.get("SOUNDRAW_ENDPOINT", "https://api.soundraw.io"),
                 default_params={"copyright_free": True},
                 priority=3
             ),
@@ -239,35 +294,37 @@ class SystemConfig:
         config.models.editing_tools = [
             EditingToolConfig(
                 name="runway_edit",
-                api_key=os.getenv("RUNWAY_API_KEY"),
-                endpoint=os.getenv("RUNWAY_ENDPOINT", "https://api.runwayml.com"),
+                api_key=env.get("RUNWAY_API_KEY"),
+                endpoint=env.get("RUNWAY_ENDPOINT", "https://api.runwayml.com"),
                 default_params={"effects": ["color_grade", "stabilize"]},
                 priority=1
             ),
             EditingToolConfig(
                 name="descript",
-                api_key=os.getenv("DESCRIPT_API_KEY"),
-                endpoint=os.getenv("DESCRIPT_ENDPOINT", "https://api.descript.com"),
+                api_key=env.get("DESCRIPT_API_KEY"),
+                endpoint=env.get("DESCRIPT_ENDPOINT", "https://api.descript.com"),
                 default_params={"auto_caption": True},
                 priority=2
             ),
             EditingToolConfig(
                 name="kapwing",
-                api_key=os.getenv("KAPWING_API_KEY"),
-                endpoint=os.getenv("KAPWING_ENDPOINT", "https://api.kapwing.com"),
+                api_key=env.get("KAPWING_API_KEY"),
+                endpoint=env.get("KAPWING_ENDPOINT", "https://api.kapwing.com"),
                 default_params={"text_effects": True},
                 priority=3
             ),
         ]
         
         # 加载服务器配置
-        config.server.host = os.getenv("SERVER_HOST", "0.0.0.0")
-        config.server.port = int(os.getenv("SERVER_PORT", "8000"))
-        config.server.ui_port = int(os.getenv("UI_PORT", "8080"))
-        config.server.debug = os.getenv("DEBUG", "false").lower() == "true"
+        config.server.host = env.get("SERVER_HOST", "0.0.0.0")
+        config.server.port = int(env.get("SERVER_PORT", "8000"))
+        config.server.ui_port = int(env.get("UI_PORT", "8080"))
+        config.server.debug = env.get("DEBUG", "false").lower() == "true"
+        config.server.create_video_rate_limit = int(env.get("CREATE_VIDEO_RATE_LIMIT", "30"))
+        config.server.max_inflight_commands = int(env.get("MAX_INFLIGHT_COMMANDS", "32"))
         
         # 加载存储配置
-        config.storage.base_path = os.getenv("STORAGE_PATH", "./storage")
+        config.storage.base_path = env.get("STORAGE_PATH", "./storage")
         config.storage.temp_path = os.path.join(config.storage.base_path, "temp")
         config.storage.output_path = os.path.join(config.storage.base_path, "output")
         config.storage.scripts_path = os.path.join(config.storage.base_path, "scripts")
@@ -280,18 +337,31 @@ class SystemConfig:
         for key, value in kwargs.items():
             if hasattr(self, key):
                 setattr(self, key, value)
+        
+        # 配置变化后清空派生查询的缓存
+        self.models.invalidate_cache()
+        self._available_cache.clear()
+    
+    def _get_available(self, kind: str, models: List[Any]) -> List[str]:
+        """获取已启用且配置了 API 密钥的模型名称，结果按类别缓存"""
+        names = self._available_cache.get(kind)
+        if names is None:
+            names = self._available_cache[kind] = tuple(
+                m.name for m in models if m.enabled and m.api_key
+            )
+        return list(names)
     
     def get_available_video_models(self) -> List[str]:
         """获取可用的视频模型列表"""
-        return [m.name for m in self.models.video_models if m.enabled and m.api_key]
+        return self._get_available("video", self.models.video_models)
     
     def get_available_voice_models(self) -> List[str]:
         """获取可用的语音模型列表"""
-        return [m.name for m in self.models.voice_models if m.enabled and m.api_key]
+        return self._get_available("voice", self.models.voice_models)
     
     def get_available_music_models(self) -> List[str]:
         """获取可用的音乐模型列表"""
-        return [m.name for m in self.models.music_models if m.enabled and m.api_key]
+        return self._get_available("music", self.models.music_models)
 
 
 # 全局配置实例
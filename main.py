@@ -4,14 +4,18 @@ TikTok 风格短视频多代理协作生成系统
 """
 
 import asyncio
+import heapq
 import logging
+import re
 import signal
 import sys
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import orjson
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
 from agents import (
@@ -23,13 +27,34 @@ from agents import (
     DistributionAgent,
 )
 from config import config
+from models.mcp import create_command_message
 from utils import file_manager, message_bus, setup_logger, get_logger
+from utils.sliding_counter import BucketWindow
+from utils.ttl_cache import ttl_cache
 
 
 # 全局代理实例
 agents = {}
 logger = None
 
+# 只读列表接口的缓存有效期（秒）
+_LIST_CACHE_TTL = 30.0
+
+# 只读列表接口刷新失败时，旧结果最多可再返回的时长（秒）；健康检查和统计接口不做兜底
+_LIST_STALE_IF_ERROR = 300.0
+
+# 健康检查和统计接口的快照有效期（秒），吸收监控系统的密集轮询
+_SNAPSHOT_CACHE_TTL = 1.0
+
+# 工作流事件流无变化时发送保活注释的间隔（秒）
+_SSE_KEEPALIVE_INTERVAL = 15.0
+
+# 创建视频接口的按 IP 限流窗口（5 个 1 分钟桶）
+_create_video_window = BucketWindow(buckets=5, bucket_seconds=60.0)
+
+# 限制同时发往中央代理的命令数，在启动时创建、关闭时重置，绑定到应用实际运行的事件循环
+_command_semaphore: Optional[asyncio.Semaphore] = None
+
 
 class CreateVideoRequest(BaseModel):
     """创建视频请求"""
@@ -60,11 +85,13 @@ class UserSelectionRequest(BaseModel):
 
 async def initialize_agents():
     """初始化所有代理"""
-    global agents, logger
+    global agents, logger, _command_semaphore
     
     logger = get_logger("main")
     logger.info("初始化代理系统...")
     
+    _command_semaphore = asyncio.Semaphore(config.server.max_inflight_commands)
+    
     # 创建代理实例
     agents["central"] = CentralAgent()
     agents["content"] = ContentAgent()
@@ -81,28 +108,39 @@ async def initialize_agents():
     await file_manager.initialize()
     logger.info("文件管理器已初始化")
     
-    # 初始化并启动所有代理
-    for name, agent in agents.items():
-        await agent.initialize()
-        await agent.start()
-        logger.info(f"代理 {name} 已启动")
+    # 并发初始化所有代理（完成消息订阅）后再并发启动，保证启动时所有代理均可接收消息
+    await asyncio.gather(*(agent.initialize() for agent in agents.values()))
+    await asyncio.gather(*(agent.start() for agent in agents.values()))
+    logger.info(f"代理已启动: {', '.join(agents)}")
     
     logger.info("所有代理初始化完成")
 
 
 async def shutdown_agents():
     """关闭所有代理"""
-    global agents, logger
+    global agents, logger, _command_semaphore
     
     if logger:
         logger.info("正在关闭代理系统...")
     
-    # 停止所有代理
-    for name, agent in agents.items():
-        await agent.stop()
-        if logger:
+    # 并发停止所有代理，耗时取决于最慢的代理
+    results = await asyncio.gather(
+        *(agent.stop() for agent in agents.values()),
+        return_exceptions=True
+    )
+    for name, result in zip(agents, results):
+        if not logger:
+            continue
+        if isinstance(result, BaseException):
+            logger.error(f"代理 {name} 停止失败: {result}")
+        else:
             logger.info(f"代理 {name} 已停止")
     
+    # 代理重启后接口数据可能变化，清空接口缓存；同步原语随事件循环一起重置
+    for endpoint in _CACHED_ENDPOINTS:
+        endpoint.cache_clear()
+    _command_semaphore = None
+    
     # 停止消息总线
     await message_bus.stop()
     if logger:
@@ -135,13 +173,30 @@ app = FastAPI(
     title="MCP Video Maker",
     description="TikTok 风格短视频多代理协作生成系统",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# 添加 CORS 中间件
+def _cors_origin_regex(origins: List[str]) -> Optional[str]:
+    """
+    将允许的来源列表合并为一个正则表达式
+    
+    来源中的 * 匹配单级子域名，如 https://*.example.com；
+    列表包含单独的 * 时允许所有来源，返回 None
+    """
+    if "*" in origins:
+        return None
+    patterns = (re.escape(origin).replace(r"\*", r"[^./]+") for origin in origins)
+    return "|".join(patterns) or None
+
+
+# 添加 CORS 中间件：启动时合并为一个正则，每次请求只做一次匹配而不是遍历列表
+_CORS_ORIGIN_REGEX = _cors_origin_regex(config.server.cors_origins)
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=config.server.cors_origins,
+    allow_origins=[] if _CORS_ORIGIN_REGEX else config.server.cors_origins,
+    allow_origin_regex=_CORS_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -160,6 +215,7 @@ async def root():
 
 
 @app.get("/health")
+@ttl_cache(seconds=_SNAPSHOT_CACHE_TTL)
 async def health_check():
     """健康检查"""
     agent_status = {}
@@ -178,47 +234,80 @@ async def health_check():
     }
 
 
+async def _send_central_command(
+    action: str,
+    parameters: Dict[str, Any],
+    timeout: float
+) -> Dict[str, Any]:
+    """
+    向中央代理发送命令并等待响应
+    
+    同时在途的命令数受信号量限制，避免突发请求堆积在中央代理和消息总线上；
+    代理返回失败或超时时抛出 400
+    """
+    if _command_semaphore is None:
+        raise HTTPException(status_code=500, detail="代理系统未初始化")
+    
+    command_msg = create_command_message(
+        source="api",
+        target="central_agent",
+        action=action,
+        parameters=parameters
+    )
+    message_id = command_msg.header.message_id
+    
+    async with _command_semaphore:
+        # 先登记响应等待再发送命令
+        message_bus.expect(message_id)
+        try:
+            await message_bus.publish(command_msg)
+        except Exception:
+            # 发布失败时不会再等待响应，撤销已登记的等待
+            message_bus.discard(message_id)
+            raise
+        
+        response = await message_bus.wait_for_response(
+            message_id=message_id,
+            timeout=timeout,
+            expected_source="central_agent"
+        )
+    
+    if response and response.body.success:
+        return {
+            "success": True,
+            "data": response.body.data
+        }
+    
+    error_msg = response.body.message if response else "请求超时"
+    raise HTTPException(status_code=400, detail=error_msg)
+
+
 @app.post("/api/videos/create")
-async def create_video(request: CreateVideoRequest):
+async def create_video(request: CreateVideoRequest, http_request: Request):
     """
     创建视频
     
     启动一个新的视频生成工作流
     """
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    # 只统计放行的请求，被拒绝的请求不占用配额
+    if _create_video_window.sum(client_ip) >= config.server.create_video_rate_limit:
+        raise HTTPException(status_code=429, detail="创建视频请求过于频繁，请稍后再试")
+    _create_video_window.incr(client_ip)
+    
     central_agent = agents.get("central")
     if not central_agent:
         raise HTTPException(status_code=500, detail="中央代理未初始化")
     
     try:
         # 创建工作流
-        from models.mcp import create_command_message
-        
-        command_msg = create_command_message(
-            source="api",
-            target="central_agent",
-            action="create_video",
-            parameters=request.model_dump()
+        return await _send_central_command(
+            "create_video",
+            request.model_dump(exclude_defaults=True),  # 默认值由中央代理补齐
+            timeout=10.0
         )
-        
-        # 发送命令
-        await message_bus.publish(command_msg)
-        
-        # 等待响应
-        response = await message_bus.wait_for_response(
-            message_id=command_msg.header.message_id,
-            timeout=10.0,
-            expected_source="central_agent"
-        )
-        
-        if response and response.body.success:
-            return {
-                "success": True,
-                "data": response.body.data
-            }
-        else:
-            error_msg = response.body.message if response else "请求超时"
-            raise HTTPException(status_code=400, detail=error_msg)
-            
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"创建视频失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -245,6 +334,58 @@ async def get_workflow_status(workflow_id: str):
     }
 
 
+async def _workflow_events(workflow):
+    """
+    工作流状态的 SSE 事件流
+    
+    每次状态或阶段变化推送一条 stage 事件，工作流结束后关闭；
+    长时间无变化时发送注释行保持连接
+    """
+    last_sent = None
+    while True:
+        changed = workflow.changed()
+        
+        # 结束标记与推送内容取自同一时刻，避免推送期间结束时丢失最终状态
+        finished = workflow.is_finished
+        
+        # to_dict 在状态未变化时返回同一个对象，据此跳过重复推送
+        data = workflow.to_dict()
+        if data is not last_sent:
+            last_sent = data
+            yield b"event: stage\ndata: " + orjson.dumps(data) + b"\n\n"
+        
+        if finished:
+            return
+        
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=_SSE_KEEPALIVE_INTERVAL)
+        except asyncio.TimeoutError:
+            yield b": keepalive\n\n"
+
+
+@app.get("/api/videos/{workflow_id}/stream")
+async def stream_workflow_status(workflow_id: str):
+    """
+    订阅工作流状态
+    
+    以 Server-Sent Events 推送工作流的阶段变化，替代轮询状态接口；
+    不支持 SSE 的客户端仍可使用 /api/videos/{workflow_id}/status
+    """
+    central_agent = agents.get("central")
+    if not central_agent:
+        raise HTTPException(status_code=500, detail="中央代理未初始化")
+    
+    workflow = central_agent.get_workflow(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail=f"工作流 {workflow_id} 不存在")
+    
+    return StreamingResponse(
+        _workflow_events(workflow),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/api/videos/{workflow_id}/cancel")
 async def cancel_workflow(workflow_id: str):
     """
@@ -261,32 +402,11 @@ async def cancel_workflow(workflow_id: str):
         raise HTTPException(status_code=404, detail=f"工作流 {workflow_id} 不存在")
     
     try:
-        from models.mcp import create_command_message
-        
-        command_msg = create_command_message(
-            source="api",
-            target="central_agent",
-            action="cancel_workflow",
-            parameters={"workflow_id": workflow_id}
-        )
-        
-        await message_bus.publish(command_msg)
-        
-        response = await message_bus.wait_for_response(
-            message_id=command_msg.header.message_id,
-            timeout=5.0,
-            expected_source="central_agent"
+        return await _send_central_command(
+            "cancel_workflow", {"workflow_id": workflow_id}, timeout=5.0
         )
-        
-        if response and response.body.success:
-            return {
-                "success": True,
-                "data": response.body.data
-            }
-        else:
-            error_msg = response.body.message if response else "请求超时"
-            raise HTTPException(status_code=400, detail=error_msg)
-            
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"取消工作流失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -304,36 +424,17 @@ async def user_selection(workflow_id: str, request: UserSelectionRequest):
         raise HTTPException(status_code=500, detail="中央代理未初始化")
     
     try:
-        from models.mcp import create_command_message
-        
-        command_msg = create_command_message(
-            source="api",
-            target="central_agent",
-            action="user_selection",
-            parameters={
+        return await _send_central_command(
+            "user_selection",
+            {
                 "workflow_id": workflow_id,
                 "selection_type": request.selection_type,
                 "selection_value": request.selection_value
-            }
-        )
-        
-        await message_bus.publish(command_msg)
-        
-        response = await message_bus.wait_for_response(
-            message_id=command_msg.header.message_id,
-            timeout=5.0,
-            expected_source="central_agent"
+            },
+            timeout=5.0
         )
-        
-        if response and response.body.success:
-            return {
-                "success": True,
-                "data": response.body.data
-            }
-        else:
-            error_msg = response.body.message if response else "请求超时"
-            raise HTTPException(status_code=400, detail=error_msg)
-            
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"提交用户选择失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -350,14 +451,9 @@ async def list_workflows(status: Optional[str] = None, limit: int = 10):
     if not central_agent:
         raise HTTPException(status_code=500, detail="中央代理未初始化")
     
-    workflows = central_agent.get_all_workflows()
-    
-    # 筛选状态
-    if status:
-        workflows = [w for w in workflows if w.status.value == status]
-    
-    # 排序和限制
-    workflows = sorted(workflows, key=lambda w: w.created_at, reverse=True)[:limit]
+    # 在中央代理中按状态筛选，再取创建时间最新的 limit 个
+    workflows = central_agent.get_all_workflows(status or None)
+    workflows = heapq.nlargest(limit, workflows, key=lambda w: w.created_at)
     
     return {
         "success": True,
@@ -369,6 +465,7 @@ async def list_workflows(status: Optional[str] = None, limit: int = 10):
 
 
 @app.get("/api/models/video")
+@ttl_cache(seconds=_LIST_CACHE_TTL, stale_if_error=_LIST_STALE_IF_ERROR, reraise=(HTTPException,))
 async def list_video_models():
     """列出可用的视频模型"""
     visual_agent = agents.get("visual")
@@ -377,11 +474,12 @@ async def list_video_models():
     
     return {
         "success": True,
-        "data": visual_agent._video_models
+        "data": orjson.loads(visual_agent._video_models_json)
     }
 
 
 @app.get("/api/models/voice")
+@ttl_cache(seconds=_LIST_CACHE_TTL, stale_if_error=_LIST_STALE_IF_ERROR, reraise=(HTTPException,))
 async def list_voice_models():
     """列出可用的语音模型"""
     audio_agent = agents.get("audio")
@@ -398,6 +496,7 @@ async def list_voice_models():
 
 
 @app.get("/api/models/music")
+@ttl_cache(seconds=_LIST_CACHE_TTL, stale_if_error=_LIST_STALE_IF_ERROR, reraise=(HTTPException,))
 async def list_music_models():
     """列出可用的音乐模型"""
     audio_agent = agents.get("audio")
@@ -411,6 +510,7 @@ async def list_music_models():
 
 
 @app.get("/api/platforms")
+@ttl_cache(seconds=_LIST_CACHE_TTL, stale_if_error=_LIST_STALE_IF_ERROR, reraise=(HTTPException,))
 async def list_platforms():
     """列出支持的分发平台"""
     distribution_agent = agents.get("distribution")
@@ -423,21 +523,26 @@ async def list_platforms():
     }
 
 
+# 风格列表在运行期间不变，导入时预先序列化，请求时直接返回
+_STYLES_BODY = orjson.dumps({
+    "success": True,
+    "data": {
+        "content_styles": config.workflow.supported_styles,
+        "video_styles": ["realistic", "cinematic", "creative", "artistic", "anime"],
+        "voice_styles": ["natural", "expressive", "professional"],
+        "music_styles": ["upbeat", "calm", "emotional", "energetic", "ambient"]
+    }
+})
+
+
 @app.get("/api/styles")
 async def list_styles():
     """列出支持的视频风格"""
-    return {
-        "success": True,
-        "data": {
-            "content_styles": config.workflow.supported_styles,
-            "video_styles": ["realistic", "cinematic", "creative", "artistic", "anime"],
-            "voice_styles": ["natural", "expressive", "professional"],
-            "music_styles": ["upbeat", "calm", "emotional", "energetic", "ambient"]
-        }
-    }
+    return Response(content=_STYLES_BODY, media_type="application/json")
 
 
 @app.get("/api/stats")
+@ttl_cache(seconds=_SNAPSHOT_CACHE_TTL)
 async def get_system_stats():
     """获取系统统计信息"""
     agent_status = {}
@@ -459,6 +564,17 @@ async def get_system_stats():
     }
 
 
+# 使用 TTL 缓存的接口
+_CACHED_ENDPOINTS = (
+    health_check,
+    list_video_models,
+    list_voice_models,
+    list_music_models,
+    list_platforms,
+    get_system_stats,
+)
+
+
 def main():
     """主函数"""
     import uvicorn
@@ -3,6 +3,7 @@ MCP (Multi-agent Communication Protocol) 消息模型
 定义了代理间通信的消息结构和工具函数
 """
 
+import secrets
 import uuid
 from datetime import datetime
 from enum import Enum
@@ -11,6 +12,11 @@ from typing import Any, Dict, List, Optional, Union
 from pydantic import BaseModel, Field
 
 
+def generate_message_id() -> str:
+    """生成消息ID（10位十六进制，直接读取随机字节，避免构造完整UUID）"""
+    return "mcp_" + secrets.token_hex(5)
+
+
 class MCPMessageType(str, Enum):
     """MCP协议消息类型枚举"""
     COMMAND = "command"            # 命令消息
@@ -53,7 +59,7 @@ class MCPStatus(str, Enum):
 
 class MCPHeader(BaseModel):
     """MCP消息头"""
-    message_id: str = Field(default_factory=lambda: f"mcp_{uuid.uuid4().hex[:10]}", description="消息唯一标识符")
+    message_id: str = Field(default_factory=generate_message_id, description="消息唯一标识符")
     correlation_id: Optional[str] = Field(None, description="相关消息ID，用于请求-响应关联")
     timestamp: datetime = Field(default_factory=datetime.now, description="消息创建时间戳")
     source: str = Field(..., description="消息来源代理")
@@ -166,7 +172,7 @@ class MCPMessage(BaseModel):
     def create_response(self, success: bool, message: str, data: Optional[Dict[str, Any]] = None) -> 'MCPMessage':
         """创建对当前消息的响应消息"""
         response_header = MCPHeader(
-            message_id=f"mcp_{uuid.uuid4().hex[:10]}",
+            message_id=generate_message_id(),
             correlation_id=self.header.message_id,
             timestamp=datetime.now(),
             source=self.header.target,
@@ -194,7 +200,7 @@ class MCPMessage(BaseModel):
     def create_error_response(self, error_code: str, error_message: str, details: Optional[Dict[str, Any]] = None) -> 'MCPMessage':
         """创建对当前消息的错误响应消息"""
         error_header = MCPHeader(
-            message_id=f"mcp_{uuid.uuid4().hex[:10]}",
+            message_id=generate_message_id(),
             correlation_id=self.header.message_id,
             timestamp=datetime.now(),
             source=self.header.target,
@@ -233,7 +239,7 @@ def create_command_message(
 ) -> MCPMessage:
     """创建命令消息"""
     header = MCPHeader(
-        message_id=f"mcp_{uuid.uuid4().hex[:10]}",
+        message_id=generate_message_id(),
         timestamp=datetime.now(),
         source=source,
         target=target,
@@ -268,7 +274,7 @@ def create_event_message(
 ) -> MCPMessage:
     """创建事件消息"""
     header = MCPHeader(
-        message_id=f"mcp_{uuid.uuid4().hex[:10]}",
+        message_id=generate_message_id(),
         timestamp=datetime.now(),
         source=source,
         target=target,
@@ -306,7 +312,7 @@ def create_query_message(
 ) -> MCPMessage:
     """创建查询消息"""
     header = MCPHeader(
-        message_id=f"mcp_{uuid.uuid4().hex[:10]}",
+        message_id=generate_message_id(),
         timestamp=datetime.now(),
         source=source,
         target=target,
@@ -341,7 +347,7 @@ def create_heartbeat_message(
 ) -> MCPMessage:
     """创建心跳消息"""
     header = MCPHeader(
-        message_id=f"mcp_{uuid.uuid4().hex[:10]}",
+        message_id=generate_message_id(),
         timestamp=datetime.now(),
         source=source,
         target=target,
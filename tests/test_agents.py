@@ -14,6 +14,7 @@ from agents import (
     PostProductionAgent,
     DistributionAgent,
 )
+from agents.central_agent import WorkflowContext, WorkflowStatus
 from models.mcp import create_command_message
 from utils.mcp_message_bus import MCPMessageBus
 
@@ -146,6 +147,147 @@ class TestVisualAgent:
         assert response.body.success is True
         assert "models" in response.body.data
         assert "keling" in response.body.data["models"]
+    
+    @staticmethod
+    def _counting_agent() -> tuple:
+        """创建关闭模拟延迟的视觉代理，返回代理和实际生成次数计数"""
+        agent = VisualAgent()
+        agent._mock_delays = False
+        generations = []
+        simulate_delay = agent._simulate_delay
+        
+        async def counting_delay(low, high):
+            generations.append(1)
+            await simulate_delay(low, high)
+        
+        agent._simulate_delay = counting_delay
+        return agent, generations
+    
+    @pytest.mark.asyncio
+    async def test_scene_cache_hit_uses_caller_directory(self):
+        """测试指定 seed 时命中缓存，返回调用方目录下的新片段"""
+        agent, generations = self._counting_agent()
+        scene = {"scene_id": 1, "visual_prompt": "海边日落", "duration": 5}
+        params = {"style": "realistic", "resolution": {"width": 1080, "height": 1920}, "model": "keling", "seed": 42}
+        
+        first = await agent._generate_scene_video(scene, output_dir="/storage/temp/s_1/", **params)
+        second = await agent._generate_scene_video(
+            {**scene, "scene_id": 2}, output_dir="/storage/temp/s_2/", **params
+        )
+        
+        assert len(generations) == 1
+        assert second["clip_id"] != first["clip_id"]
+        assert second["file_path"] == f"/storage/temp/s_2/{second['clip_id']}.mp4"
+        assert second["scene_id"] == 2
+        assert second["generation_params"] == first["generation_params"]
+    
+    @pytest.mark.asyncio
+    async def test_scene_cache_hit_links_file(self, tmp_path):
+        """测试缓存命中时将已生成的文件链接到调用方目录"""
+        agent, generations = self._counting_agent()
+        scene = {"scene_id": 1, "visual_prompt": "海边日落", "duration": 5}
+        params = {"style": "realistic", "resolution": {"width": 1080, "height": 1920}, "model": "keling", "seed": 42}
+        
+        first = await agent._generate_scene_video(scene, output_dir=f"{tmp_path}/s_1/", **params)
+        (tmp_path / "s_1").mkdir()
+        with open(first["file_path"], "wb") as f:
+            f.write(b"mp4")
+        
+        second = await agent._generate_scene_video(scene, output_dir=f"{tmp_path}/s_2/", **params)
+        
+        assert len(generations) == 1
+        with open(second["file_path"], "rb") as f:
+            assert f.read() == b"mp4"
+    
+    @pytest.mark.asyncio
+    async def test_duplicate_scenes_generated_once(self):
+        """测试重复场景只生成一次且各自拥有片段 ID，无提示词的场景不合并"""
+        agent, generations = self._counting_agent()
+        scenes = [
+            {"scene_id": 1, "visual_prompt": "海边日落", "duration": 5},
+            {"scene_id": 2, "visual_prompt": "海边日落", "duration": 5},
+            {"scene_id": 3, "duration": 5},
+            {"scene_id": 4, "duration": 5},
+        ]
+        
+        result = await agent._handle_generate_video({"script": {"scenes": scenes}}, "s_1")
+        clips = result["clips"]
+        
+        assert len(generations) == 3
+        assert [clip["scene_id"] for clip in clips] == [1, 2, 3, 4]
+        assert len({clip["clip_id"] for clip in clips}) == 4
+        assert all(clip["file_path"] == f"/storage/temp/s_1/{clip['clip_id']}.mp4" for clip in clips)
+    
+    @pytest.mark.asyncio
+    async def test_generate_video_stream_emits_clip_events(self):
+        """测试流式生成每完成一个片段广播一次事件，结果按场景顺序返回"""
+        agent, _ = self._counting_agent()
+        events = []
+        
+        async def record_event(event_type, data, **kwargs):
+            events.append((event_type, data))
+        
+        agent.broadcast_event = record_event
+        scenes = [{"scene_id": i, "visual_prompt": f"场景{i}", "duration": 3} for i in range(1, 4)]
+        
+        result = await agent._handle_generate_video_stream({"script": {"scenes": scenes}}, "s_1")
+        
+        assert [event_type for event_type, _ in events] == ["video.clip_generated"] * 3
+        assert sorted(data["index"] for _, data in events) == [0, 1, 2]
+        assert all(data["total"] == 3 for _, data in events)
+        assert [clip["scene_id"] for clip in result["clips"]] == [1, 2, 3]
+    
+    @pytest.mark.asyncio
+    async def test_upscale_accepts_unknown_target(self):
+        """测试未知目标分辨率仍按模拟处理返回结果"""
+        agent, _ = self._counting_agent()
+        
+        result = await agent._handle_upscale_video(
+            {"video_path": "/storage/temp/s_1/clip.mp4", "target_resolution": "8k"}, "s_1"
+        )
+        
+        assert result["status"] == "upscaled"
+        assert result["target_resolution"] == "8k"
+    
+    @pytest.mark.asyncio
+    async def test_list_models_returns_independent_copy(self):
+        """测试修改模型列表结果不影响代理的模型表"""
+        agent = VisualAgent()
+        
+        result = await agent._handle_list_models({}, "s_1")
+        result["models"]["keling"]["x"] = 1
+        result["models"]["keling"]["strengths"].append("custom")
+        
+        fresh = await agent._handle_list_models({}, "s_1")
+        assert "x" not in fresh["models"]["keling"]
+        assert "custom" not in fresh["models"]["keling"]["strengths"]
+        assert "x" not in VisualAgent._video_models["keling"]
+    
+    @pytest.mark.asyncio
+    async def test_scene_cache_miss_without_seed(self):
+        """测试未指定 seed 时不使用缓存"""
+        agent, generations = self._counting_agent()
+        scene = {"scene_id": 1, "visual_prompt": "海边日落", "duration": 5}
+        params = {"style": "realistic", "resolution": {"width": 1080, "height": 1920}, "model": "keling"}
+        
+        await agent._generate_scene_video(scene, **params)
+        await agent._generate_scene_video(scene, **params)
+        
+        assert len(generations) == 2
+        assert not agent._result_cache
+    
+    @pytest.mark.asyncio
+    async def test_scene_ignore_cache_regenerates(self):
+        """测试 ignore_cache 时跳过缓存重新生成"""
+        agent, generations = self._counting_agent()
+        
+        await agent._handle_generate_scene({"prompt": "城市夜景", "seed": 7}, "s_1")
+        cached = await agent._handle_generate_scene({"prompt": "城市夜景", "seed": 7}, "s_1")
+        assert len(generations) == 1
+        
+        await agent._handle_generate_scene({"prompt": "城市夜景", "seed": 7, "ignore_cache": True}, "s_1")
+        assert len(generations) == 2
+        assert cached["file_path"].startswith("/storage/temp/s_1/")
 
 
 class TestAudioAgent:
@@ -175,6 +317,129 @@ class TestAudioAgent:
         assert "voice_presets" in response.body.data
 
 
+def _postprod_job(session_id: str, **video) -> dict:
+    """构建后期制作流水线任务"""
+    return {
+        "video": {"clips": [{"duration": 5}], **video},
+        "audio": None,
+        "script": None,
+        "effects": ["color_grade"],
+        "subtitles": False,
+        "session_id": session_id,
+        "ids": "0123456789abcdef",
+        "temp_dir": f"/storage/temp/{session_id}/",
+        "output_dir": f"/storage/output/{session_id}/",
+    }
+
+
+class TestPostProductionAgent:
+    """后期制作代理测试"""
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_survives_cancelled_failing_job(self):
+        """测试任务在失败阶段中被取消后，流水线仍能处理后续任务"""
+        agent = PostProductionAgent()
+        agent._simulate_latency = False
+        
+        gate = asyncio.Event()
+        stage_compose = agent._stage_compose
+        
+        async def compose(job):
+            if job["video"].get("fail"):
+                await gate.wait()
+                raise RuntimeError("compose failed")
+            await stage_compose(job)
+        
+        agent._stage_compose = compose
+        await agent.on_start()
+        try:
+            # 第一个任务阻塞在合成阶段时取消调用方，随后阶段失败
+            first = agent._stream_post_produce(_postprod_job("s_1", fail=True))
+            pending = asyncio.create_task(first.__anext__())
+            await asyncio.sleep(0.01)
+            pending.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await pending
+            gate.set()
+            await asyncio.sleep(0.01)
+            
+            async def run_second():
+                return [event["stage"] async for event in agent._stream_post_produce(_postprod_job("s_2"))]
+            
+            stages = await asyncio.wait_for(run_second(), timeout=5.0)
+            assert stages == ["compose", "effects", "render"]
+            assert all(not task.done() for task in agent._pipeline_tasks)
+        finally:
+            await agent.on_stop()
+    
+    @pytest.mark.asyncio
+    async def test_stop_fails_in_flight_jobs(self):
+        """测试任务处理中停止代理时，调用方收到错误而不是永远等待"""
+        agent = PostProductionAgent()
+        agent._simulate_latency = False
+        
+        gate = asyncio.Event()
+        
+        async def compose(job):
+            await gate.wait()
+        
+        agent._stage_compose = compose
+        await agent.on_start()
+        
+        # 一个任务阻塞在合成阶段，另一个积压在队列中
+        tasks = [
+            asyncio.create_task(agent._handle_post_produce({"video": {"clips": []}}, f"s_{i}"))
+            for i in range(2)
+        ]
+        await asyncio.sleep(0.01)
+        await agent.on_stop()
+        
+        results = await asyncio.wait_for(
+            asyncio.gather(*tasks, return_exceptions=True), timeout=5.0
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert agent._pipeline_jobs == {}
+    
+    @pytest.mark.asyncio
+    async def test_render_keeps_clip_resolution(self):
+        """测试成片保持片段的分辨率，不固定为竖屏"""
+        agent = PostProductionAgent()
+        agent._simulate_latency = False
+        job = _postprod_job("s_1")
+        job["video"]["clips"][0]["resolution"] = {"width": 1920, "height": 1080}
+        
+        stages = [event["stage"] async for event in agent._stream_post_produce(job)]
+        
+        assert stages == ["compose", "effects", "render"]
+        assert job["final"]["resolution"] == {"width": 1920, "height": 1080}
+    
+    @pytest.mark.asyncio
+    async def test_render_resolution_from_aspect_ratio(self):
+        """测试片段未提供分辨率时按宽高比确定成片尺寸"""
+        agent = PostProductionAgent()
+        agent._simulate_latency = False
+        job = _postprod_job("s_1", metadata={"aspect_ratio": "1:1"})
+        
+        async for _ in agent._stream_post_produce(job):
+            pass
+        
+        assert job["final"]["resolution"] == {"width": 1080, "height": 1080}
+    
+    @pytest.mark.asyncio
+    async def test_list_effects_returns_independent_copy(self):
+        """测试修改特效列表结果不影响代理的特效目录"""
+        agent = PostProductionAgent()
+        
+        catalog = await agent._handle_list_effects({}, "s_1")
+        catalog["transitions"].clear()
+        catalog["effects"]["blur"]["types"].append("custom")
+        
+        fresh = await agent._handle_list_effects({}, "s_1")
+        assert "fade" in fresh["transitions"]
+        assert "custom" not in fresh["effects"]["blur"]["types"]
+        assert "fade" in PostProductionAgent._transitions
+
+
 class TestMessageBus:
     """消息总线测试"""
     
@@ -208,6 +473,34 @@ class TestMessageBus:
         
         await bus.stop()
     
+    @pytest.mark.asyncio
+    async def test_expect_receives_early_response(self):
+        """测试先登记等待时，早于 wait_for_response 到达的响应不会丢失"""
+        bus = MCPMessageBus()
+        await bus.start()
+        
+        command = create_command_message(
+            source="test_source",
+            target="test_target",
+            action="test_action",
+            parameters={}
+        )
+        
+        bus.expect(command.header.message_id)
+        await bus.publish(command)
+        await bus.publish(command.create_response(success=True, message="ok"))
+        
+        response = await bus.wait_for_response(
+            message_id=command.header.message_id,
+            timeout=1.0,
+            expected_source="test_target"
+        )
+        
+        assert response is not None
+        assert response.header.correlation_id == command.header.message_id
+        
+        await bus.stop()
+    
     @pytest.mark.asyncio
     async def test_metrics(self):
         """测试指标收集"""
@@ -221,6 +514,58 @@ class TestMessageBus:
         assert "queue_size" in metrics
         
         await bus.stop()
+    
+    @pytest.mark.asyncio
+    async def test_send_command_publish_failure_discards_waiter(self, monkeypatch):
+        """测试代理发送命令失败时撤销已登记的响应等待"""
+        from utils.mcp_message_bus import message_bus
+        
+        async def failing_publish(message):
+            raise RuntimeError("消息总线未启动")
+        
+        monkeypatch.setattr(message_bus, "publish", failing_publish)
+        agent = ContentAgent()
+        agent.is_running = True
+        
+        with pytest.raises(RuntimeError):
+            await agent.send_command("visual_agent", "generate_scene", {})
+        
+        assert message_bus._response_waiters == {}
+
+
+class TestWorkflowContext:
+    """工作流上下文测试"""
+    
+    def test_to_dict_cache_invalidated_on_change(self):
+        """测试 to_dict 缓存在状态变化后失效"""
+        workflow = WorkflowContext(workflow_id="wf_1", session_id="s_1")
+        
+        first = workflow.to_dict()
+        assert workflow.to_dict() is first
+        
+        workflow.status = WorkflowStatus.PROCESSING
+        assert workflow.to_dict()["status"] == "processing"
+        
+        workflow.update_stage("script_creation", status="completed")
+        assert workflow.to_dict()["stages"]["script_creation"]["status"] == "completed"
+    
+    @pytest.mark.asyncio
+    async def test_changed_event_set_on_update(self):
+        """测试状态变化时触发变化事件"""
+        workflow = WorkflowContext(workflow_id="wf_1", session_id="s_1")
+        
+        changed = workflow.changed()
+        assert not changed.is_set()
+        
+        workflow.user_request["theme"] = "test"
+        assert not changed.is_set()
+        
+        workflow.status = WorkflowStatus.COMPLETED
+        assert changed.is_set()
+        assert workflow.is_finished
+        
+        # 每次变化后返回新的事件
+        assert not workflow.changed().is_set()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""
+API 接口测试
+测试 main 模块中的接口辅助逻辑
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import main
+from agents.central_agent import WorkflowContext, WorkflowStatus
+from utils.sliding_counter import BucketWindow
+
+
+class TestCentralCommand:
+    """中央代理命令发送测试"""
+
+    @pytest.mark.asyncio
+    async def test_publish_failure_discards_waiter(self, monkeypatch):
+        """测试命令发布失败时撤销已登记的响应等待"""
+        async def failing_publish(message):
+            raise RuntimeError("消息总线未启动")
+
+        monkeypatch.setattr(main, "_command_semaphore", asyncio.Semaphore(1))
+        monkeypatch.setattr(main.message_bus, "publish", failing_publish)
+
+        with pytest.raises(RuntimeError):
+            await main._send_central_command("get_workflow_status", {}, timeout=1.0)
+
+        assert main.message_bus._response_waiters == {}
+
+
+class TestCreateVideoRateLimit:
+    """创建视频限流测试"""
+
+    @pytest.mark.asyncio
+    async def test_rejected_requests_not_counted(self, monkeypatch):
+        """测试超限返回 429，被拒绝的请求不计入窗口"""
+        window = BucketWindow(buckets=5, bucket_seconds=60.0)
+        monkeypatch.setattr(main, "_create_video_window", window)
+        monkeypatch.setattr(main.config.server, "create_video_rate_limit", 2)
+        monkeypatch.setattr(main, "agents", {})
+        http_request = Request({"type": "http", "client": ("10.0.0.1", 1234)})
+        request = main.CreateVideoRequest(theme="猫")
+
+        statuses = []
+        for _ in range(4):
+            with pytest.raises(HTTPException) as exc_info:
+                await main.create_video(request, http_request)
+            statuses.append(exc_info.value.status_code)
+
+        # 放行的请求因中央代理未初始化返回 500
+        assert statuses == [500, 500, 429, 429]
+        assert window.sum("10.0.0.1") == 2
+
+
+class TestWorkflowStream:
+    """工作流状态 SSE 推送测试"""
+
+    @staticmethod
+    def _stream(monkeypatch, workflow):
+        """通过接口函数获取工作流的 SSE 响应"""
+        central = SimpleNamespace(get_workflow={workflow.workflow_id: workflow}.get)
+        monkeypatch.setattr(main, "agents", {"central": central})
+        return main.stream_workflow_status(workflow.workflow_id)
+
+    @staticmethod
+    def _parse(chunk: bytes):
+        """解析一条 stage 事件"""
+        event, data = chunk.decode().rstrip("\n").split("\n")
+        assert event == "event: stage"
+        return orjson.loads(data[len("data: "):])
+
+    @pytest.mark.asyncio
+    async def test_stage_events_until_finished(self, monkeypatch):
+        """测试状态变化时推送 stage 事件，工作流结束后关闭流"""
+        workflow = WorkflowContext(workflow_id="wf_1", session_id="s_1")
+        response = await self._stream(monkeypatch, workflow)
+        assert response.media_type == "text/event-stream"
+        events = response.body_iterator
+
+        first = self._parse(await events.__anext__())
+        assert first["status"] == "pending"
+
+        workflow.update_stage("script_creation", status="completed")
+        second = self._parse(await asyncio.wait_for(events.__anext__(), timeout=1.0))
+        assert second["stages"]["script_creation"]["status"] == "completed"
+
+        workflow.status = WorkflowStatus.COMPLETED
+        last = self._parse(await asyncio.wait_for(events.__anext__(), timeout=1.0))
+        assert last["status"] == "completed"
+
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.wait_for(events.__anext__(), timeout=1.0)
+
+    @pytest.mark.asyncio
+    async def test_finished_workflow_sends_one_event(self, monkeypatch):
+        """测试已结束的工作流只推送当前状态后立即关闭"""
+        workflow = WorkflowContext(workflow_id="wf_2", session_id="s_2")
+        workflow.status = WorkflowStatus.FAILED
+        response = await self._stream(monkeypatch, workflow)
+
+        chunks = [chunk async for chunk in response.body_iterator]
+
+        assert len(chunks) == 1
+        assert self._parse(chunks[0])["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_unknown_workflow_returns_404(self, monkeypatch):
+        """测试工作流不存在时返回 404"""
+        monkeypatch.setattr(main, "agents", {"central": SimpleNamespace(get_workflow=lambda _: None)})
+
+        with pytest.raises(HTTPException) as exc_info:
+            await main.stream_workflow_status("missing")
+
+        assert exc_info.value.status_code == 404
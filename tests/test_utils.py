@@ -0,0 +1,203 @@
+"""
+工具模块测试
+测试缓存、限流、滑动窗口计数等通用工具
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from utils.ffmpeg import (SOFTWARE_ENCODER, build_encode_command, quote_concat_path,
+                          quote_filter_path)
+from utils.rate_limiter import TokenBucket, get_bucket
+from utils.sliding_counter import BucketWindow
+from utils.ttl_cache import ttl_cache
+
+
+class TestTTLCache:
+    """TTL 缓存测试"""
+
+    @pytest.mark.asyncio
+    async def test_cached_within_ttl(self):
+        """测试有效期内复用结果，并发调用只计算一次"""
+        calls = []
+
+        @ttl_cache(seconds=60)
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"value": len(calls)}
+
+        results = await asyncio.gather(*(load() for _ in range(5)))
+
+        assert len(calls) == 1
+        assert all(result == {"value": 1} for result in results)
+
+        load.cache_clear()
+        assert await load() == {"value": 2}
+
+    @pytest.mark.asyncio
+    async def test_error_raises_by_default(self):
+        """测试默认不兜底，刷新失败时直接抛出异常"""
+        state = {"fail": False}
+
+        @ttl_cache(seconds=0)
+        async def load():
+            if state["fail"]:
+                raise RuntimeError("boom")
+            return "ok"
+
+        assert await load() == "ok"
+
+        state["fail"] = True
+        with pytest.raises(RuntimeError):
+            await load()
+
+    @pytest.mark.asyncio
+    async def test_stale_fallback_on_error(self, monkeypatch):
+        """测试开启兜底时返回旧结果，超过最大过期时长后抛出异常"""
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        state = {"fail": False}
+
+        @ttl_cache(seconds=10, stale_if_error=60)
+        async def load():
+            if state["fail"]:
+                raise RuntimeError("boom")
+            return "ok"
+
+        assert await load() == "ok"
+
+        state["fail"] = True
+        now[0] += 30
+        assert await load() == "ok"
+
+        now[0] += 60
+        with pytest.raises(RuntimeError):
+            await load()
+
+        load.cache_clear()
+        with pytest.raises(RuntimeError):
+            await load()
+
+    @pytest.mark.asyncio
+    async def test_reraise_skips_stale_fallback(self):
+        """测试 reraise 中的异常类型不使用旧结果兜底"""
+        class NotReady(Exception):
+            pass
+
+        state = {"fail": False}
+
+        @ttl_cache(seconds=0, stale_if_error=60, reraise=(NotReady,))
+        async def load():
+            if state["fail"]:
+                raise NotReady()
+            return "ok"
+
+        assert await load() == "ok"
+
+        state["fail"] = True
+        with pytest.raises(NotReady):
+            await load()
+
+    def test_usable_across_event_loops(self):
+        """测试在新的事件循环中（如测试客户端重启应用）仍可并发调用"""
+        @ttl_cache(seconds=0)
+        async def load():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        async def burst():
+            return await asyncio.gather(*(load() for _ in range(3)))
+
+        assert asyncio.run(burst()) == ["ok"] * 3
+        assert asyncio.run(burst()) == ["ok"] * 3
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    def test_burst_up_to_capacity(self):
+        """测试突发请求不超过桶容量"""
+        bucket = TokenBucket(requests_per_minute=60, capacity=3)
+
+        assert all(bucket.try_acquire() for _ in range(3))
+        assert not bucket.try_acquire()
+
+    @pytest.mark.asyncio
+    async def test_acquire_waits_for_refill(self):
+        """测试令牌不足时等待补充"""
+        bucket = TokenBucket(requests_per_minute=600, capacity=1)  # 每秒补充 10 个
+
+        await bucket.acquire()
+        start = time.monotonic()
+        await bucket.acquire()
+
+        assert time.monotonic() - start >= 0.05
+
+    def test_get_bucket_per_provider(self):
+        """测试按服务商返回同一个令牌桶"""
+        assert get_bucket("keling") is get_bucket("keling")
+        assert get_bucket("keling") is not get_bucket("pika")
+
+
+class TestBucketWindow:
+    """分桶滑动窗口测试"""
+
+    def test_counts_expire_with_buckets(self, monkeypatch):
+        """测试计数按键累加，超出窗口的桶被丢弃"""
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        window = BucketWindow(buckets=3, bucket_seconds=10)
+
+        window.incr("a")
+        window.incr("a")
+        window.incr("b")
+        assert window.sum("a") == 2
+        assert window.sum("b") == 1
+
+        now[0] += 10
+        assert window.incr("a") == 3
+
+        # 最早的桶移出窗口
+        now[0] += 20
+        assert window.sum("a") == 1
+        assert window.sum("b") == 0
+
+        now[0] += 100
+        assert window.sum("a") == 0
+
+
+class TestFFmpegCommands:
+    """FFmpeg 命令构建测试"""
+
+    def test_encode_copies_audio_by_default(self):
+        """测试未指定音频时复制输入视频的音轨"""
+        args = build_encode_command("in.mp4", "out.mp4", SOFTWARE_ENCODER, width=1920, height=1080)
+
+        assert args[args.index("-c:a") + 1] == "copy"
+        assert "scale=1920:1080" in args[args.index("-vf") + 1]
+        assert "-map" not in args
+
+    def test_encode_muxes_external_audio(self):
+        """测试指定音频时作为第二路输入并映射为音轨"""
+        args = build_encode_command("in.mp4", "out.mp4", SOFTWARE_ENCODER, audio_path="mix.wav")
+
+        inputs = [args[i + 1] for i, arg in enumerate(args) if arg == "-i"]
+        assert inputs == ["in.mp4", "mix.wav"]
+        assert args[args.index("-map") + 1] == "0:v:0"
+        assert "1:a:0" in args
+        assert args[args.index("-c:a") + 1] == "aac"
+        assert args[-1] == "out.mp4"
+
+    def test_quote_filter_path(self):
+        """测试滤镜路径按选项值和滤镜图两层转义"""
+        assert quote_filter_path("/storage/temp/s_1/final.ass") == "/storage/temp/s_1/final.ass"
+        assert quote_filter_path("/tmp/a'b:c.ass") == r"/tmp/a\\\'b\\:c.ass"
+        assert quote_filter_path(r"/tmp/a\b,c.ass") == r"/tmp/a\\\\b\,c.ass"
+
+    def test_quote_concat_path(self):
+        """测试 concat 列表路径中的单引号被正确转义"""
+        assert quote_concat_path("/tmp/clip.mp4") == "'/tmp/clip.mp4'"
+        assert quote_concat_path("/tmp/it's.mp4") == r"'/tmp/it'\''s.mp4'"
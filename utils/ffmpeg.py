@@ -0,0 +1,198 @@
+"""
+FFmpeg 工具模块
+负责选择编码器、构建编码命令并以异步子进程方式执行 FFmpeg
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+logger = logging.getLogger("mcp.ffmpeg")
+
+
+@dataclass(frozen=True)
+class EncoderSpec:
+    """编码器配置"""
+    name: str                                              # GPU_ENCODER 取值
+    codec: str                                             # FFmpeg 视频编码器
+    input_args: List[str] = field(default_factory=list)    # 放在 -i 之前的硬件加速参数
+    output_args: List[str] = field(default_factory=list)   # 编码器附加参数
+    upload_filter: Optional[str] = None                    # 需要追加在滤镜链末尾的上传滤镜
+
+
+# 支持的硬件编码器，按 GPU_ENCODER 环境变量选择
+_GPU_ENCODERS = {
+    "nvenc": EncoderSpec(
+        name="nvenc",
+        codec="h264_nvenc",
+        input_args=["-hwaccel", "cuda"],
+        output_args=["-preset", "p4"]
+    ),
+    "qsv": EncoderSpec(
+        name="qsv",
+        codec="h264_qsv",
+        input_args=["-hwaccel", "qsv"]
+    ),
+    "vaapi": EncoderSpec(
+        name="vaapi",
+        codec="h264_vaapi",
+        input_args=["-vaapi_device", "/dev/dri/renderD128"],
+        upload_filter="format=nv12,hwupload"
+    ),
+}
+
+# 软件编码回退
+SOFTWARE_ENCODER = EncoderSpec(
+    name="none",
+    codec="libx264",
+    output_args=["-preset", "medium"]
+)
+
+# ffmpeg -encoders 的探测结果，进程内只探测一次
+_available_encoders: Optional[Set[str]] = None
+
+
+def ffmpeg_available() -> bool:
+    """检查系统中是否安装了 FFmpeg"""
+    return shutil.which("ffmpeg") is not None
+
+
+async def probe_encoders() -> Set[str]:
+    """探测 FFmpeg 支持的编码器"""
+    global _available_encoders
+    if _available_encoders is not None:
+        return _available_encoders
+
+    encoders: Set[str] = set()
+    if ffmpeg_available():
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-encoders",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await proc.communicate()
+        for line in stdout.decode("utf-8", errors="ignore").splitlines():
+            parts = line.split()
+            # 编码器行格式: " V....D libx264   描述"
+            if len(parts) >= 2 and parts[0].startswith("V"):
+                encoders.add(parts[1])
+
+    _available_encoders = encoders
+    return encoders
+
+
+async def select_encoder() -> EncoderSpec:
+    """根据 GPU_ENCODER 环境变量选择编码器，不可用时回退到 libx264"""
+    name = os.getenv("GPU_ENCODER", "none").lower()
+    spec = _GPU_ENCODERS.get(name)
+    if spec is None:
+        return SOFTWARE_ENCODER
+
+    if spec.codec not in await probe_encoders():
+        logger.warning("FFmpeg 不支持编码器 %s，回退到 %s", spec.codec, SOFTWARE_ENCODER.codec)
+        return SOFTWARE_ENCODER
+
+    return spec
+
+
+def build_encode_command(
+    input_path: str,
+    output_path: str,
+    encoder: EncoderSpec,
+    bitrate: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    filters: Optional[List[str]] = None,
+    threads: Optional[int] = None,
+    audio_path: Optional[str] = None
+) -> List[str]:
+    """
+    构建编码命令参数（不含 ffmpeg 可执行文件本身）
+
+    指定 audio_path 时将其作为音轨替换输入视频原有的音频，否则复制原音频
+    """
+    # 显式指定解码线程数，避免部分解码器默认单线程
+    thread_args = ["-threads", str(threads)] if threads else []
+    args = [*encoder.input_args, *thread_args, "-i", input_path]
+    if audio_path:
+        args += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+
+    video_filters = list(filters or [])
+    if width and height:
+        video_filters.append(f"scale={width}:{height}")
+    if encoder.upload_filter:
+        video_filters.append(encoder.upload_filter)
+    if video_filters:
+        args += ["-vf", ",".join(video_filters)]
+
+    args += ["-c:v", encoder.codec, *encoder.output_args, *thread_args]
+    if threads and encoder.codec == "libx264":
+        # x264 优先使用帧级并行
+        args += ["-x264-params", f"threads={threads}:sliced-threads=0"]
+    if bitrate:
+        args += ["-b:v", bitrate]
+    if audio_path:
+        # 外部音频格式不一定能直接放进 mp4，统一编码为 AAC，按较短的一路结束
+        args += ["-c:a", "aac", "-shortest", output_path]
+    else:
+        args += ["-c:a", "copy", output_path]
+
+    return args
+
+
+def _escape(text: str, special: str) -> str:
+    """在 special 中的每个字符前加反斜杠"""
+    return "".join("\\" + ch if ch in special else ch for ch in text)
+
+
+def quote_filter_path(path: str) -> str:
+    """
+    转义滤镜参数中的文件路径（如 subtitles=）
+
+    FFmpeg 先按滤镜图语法、再按选项值语法各解析一次，需要逐层转义：
+    选项值层转义 \\ ' :，滤镜图层再转义 \\ ' [ ] , ;
+    """
+    return _escape(_escape(path, "\\':"), "\\'[],;")
+
+
+def quote_concat_path(path: str) -> str:
+    """将路径写成 concat 列表中的单引号字符串，路径中的单引号写作 '\\''"""
+    return "'" + path.replace("'", "'\\''") + "'"
+
+
+def build_concat_command(list_path: str, output_path: str) -> List[str]:
+    """构建按 concat 列表文件无损拼接片段的命令参数"""
+    return ["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path]
+
+
+def build_thumbnail_command(
+    input_path: str,
+    output_path: str,
+    timestamp: float = 0,
+    width: int = 1080,
+    height: int = 1920
+) -> List[str]:
+    """构建截取缩略图的命令参数，-ss 放在 -i 之前以按关键帧快速定位"""
+    fit = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+    )
+    return [
+        "-ss", str(timestamp), "-i", input_path,
+        "-frames:v", "1", "-q:v", "3", "-vf", fit, output_path
+    ]
+
+
+async def run_ffmpeg(args: List[str]):
+    """以异步子进程执行 FFmpeg，失败时抛出 RuntimeError"""
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"FFmpeg 执行失败: {stderr.decode('utf-8', errors='ignore').strip()}")
@@ -5,7 +5,6 @@
 
 import asyncio
 import hashlib
-import json
 import os
 import shutil
 import uuid
@@ -15,6 +14,7 @@ from typing import Any, Dict, List, Optional, Union
 
 import aiofiles
 import aiofiles.os
+import orjson
 
 
 class FileManager:
@@ -46,12 +46,18 @@ class FileManager:
             self.audio_path,
         ]
         
-        for directory in directories:
-            await self._ensure_directory(directory)
+        # 在一次线程调用中创建全部目录，避免逐个目录检查并切换线程
+        await asyncio.to_thread(self._make_directories, directories)
         
         # 加载元数据
         await self._load_metadata()
     
+    @staticmethod
+    def _make_directories(directories: List[Path]):
+        """同步创建目录，父目录排在子目录之前，已存在时直接跳过"""
+        for directory in directories:
+            directory.mkdir(parents=True, exist_ok=True)
+    
     async def _ensure_directory(self, path: Path):
         """确保目录存在"""
         if not await aiofiles.os.path.exists(path):
@@ -60,16 +66,17 @@ class FileManager:
     async def _load_metadata(self):
         """加载文件元数据"""
         if await aiofiles.os.path.exists(self._metadata_file):
-            async with aiofiles.open(self._metadata_file, "r", encoding="utf-8") as f:
+            async with aiofiles.open(self._metadata_file, "rb") as f:
                 content = await f.read()
-                self._metadata = json.loads(content) if content else {}
+                self._metadata = orjson.loads(content) if content else {}
         else:
             self._metadata = {}
     
     async def _save_metadata(self):
         """保存文件元数据"""
-        async with aiofiles.open(self._metadata_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(self._metadata, indent=2, default=str))
+        payload = orjson.dumps(self._metadata, option=orjson.OPT_INDENT_2, default=str)
+        async with aiofiles.open(self._metadata_file, "wb") as f:
+            await f.write(payload)
     
     def _generate_file_id(self) -> str:
         """生成唯一文件ID"""
@@ -86,8 +93,10 @@ class FileManager:
         filename = f"{session_id}_{script_id}.json"
         filepath = self.scripts_path / filename
         
-        async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(script_data, indent=2, ensure_ascii=False))
+        # 先编码再写入，文件大小直接取自字节长度，避免在事件循环中同步 stat
+        payload = orjson.dumps(script_data, option=orjson.OPT_INDENT_2)
+        async with aiofiles.open(filepath, "wb") as f:
+            await f.write(payload)
         
         # 更新元数据
         self._metadata[script_id] = {
@@ -95,7 +104,7 @@ class FileManager:
             "session_id": session_id,
             "filepath": str(filepath),
             "created_at": datetime.now().isoformat(),
-            "size": os.path.getsize(filepath)
+            "size": len(payload)
         }
         await self._save_metadata()
         
@@ -106,9 +115,9 @@ class FileManager:
         if script_id in self._metadata:
             filepath = Path(self._metadata[script_id]["filepath"])
             if await aiofiles.os.path.exists(filepath):
-                async with aiofiles.open(filepath, "r", encoding="utf-8") as f:
+                async with aiofiles.open(filepath, "rb") as f:
                     content = await f.read()
-                    return json.loads(content)
+                    return orjson.loads(content)
         return None
     
     async def save_video(
@@ -180,12 +189,9 @@ class FileManager:
         
         filepath = temp_dir / f"{file_id}_{filename}"
         
-        if isinstance(data, str):
-            async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
-                await f.write(data)
-        else:
-            async with aiofiles.open(filepath, "wb") as f:
-                await f.write(data)
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        async with aiofiles.open(filepath, "wb") as f:
+            await f.write(payload)
         
         # 更新元数据
         self._metadata[file_id] = {
@@ -194,7 +200,7 @@ class FileManager:
             "filepath": str(filepath),
             "filename": filename,
             "created_at": datetime.now().isoformat(),
-            "size": os.path.getsize(filepath)
+            "size": len(payload)
         }
         await self._save_metadata()
         
@@ -221,6 +227,26 @@ class FileManager:
             return True
         return False
     
+    async def _delete_files(self, file_ids: List[str]):
+        """批量删除文件：并发删除磁盘文件，元数据只保存一次"""
+        paths = [
+            Path(self._metadata.pop(file_id)["filepath"])
+            for file_id in file_ids if file_id in self._metadata
+        ]
+        if not paths:
+            return
+        
+        await asyncio.gather(*(self._remove_if_exists(path) for path in paths))
+        await self._save_metadata()
+    
+    @staticmethod
+    async def _remove_if_exists(path: Path):
+        """删除文件，文件已不存在时忽略"""
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
+    
     async def cleanup_session(self, session_id: str):
         """清理会话相关的所有临时文件"""
         files_to_delete = [
@@ -228,8 +254,7 @@ class FileManager:
             if meta.get("session_id") == session_id and meta.get("type") == "temp"
         ]
         
-        for file_id in files_to_delete:
-            await self.delete_file(file_id)
+        await self._delete_files(files_to_delete)
         
         # 清理会话临时目录
         session_temp_dir = self.temp_path / session_id
@@ -247,8 +272,7 @@ class FileManager:
                 if created_at < cutoff_time:
                     files_to_delete.append(file_id)
         
-        for file_id in files_to_delete:
-            await self.delete_file(file_id)
+        await self._delete_files(files_to_delete)
         
         return len(files_to_delete)
     
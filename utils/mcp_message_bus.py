@@ -73,6 +73,9 @@ class MCPMessageBus:
         self.logger.info("启动消息总线")
         self._is_running = True
         
+        # 队列绑定创建时的事件循环，每次启动时在当前循环中重建
+        self._message_queue = asyncio.Queue()
+        
         # 启动消息处理任务
         self._message_processor_task = asyncio.create_task(self._process_messages())
         
@@ -217,6 +220,20 @@ class MCPMessageBus:
             if not self._type_subscribers[message_type]:
                 del self._type_subscribers[message_type]
 
+    def expect(self, message_id: str) -> asyncio.Future:
+        """登记对某条消息的响应等待，需在发布该消息之前调用，避免响应先于等待到达而丢失"""
+        future = self._response_waiters.get(message_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._response_waiters[message_id] = future
+        return future
+
+    def discard(self, message_id: str):
+        """撤销对某条消息的响应等待，用于登记后消息发布失败等不再等待的情况"""
+        future = self._response_waiters.pop(message_id, None)
+        if future is not None and not future.done():
+            future.cancel()
+
     async def wait_for_response(
         self, 
         message_id: str, 
@@ -227,9 +244,8 @@ class MCPMessageBus:
         if not self._is_running:
             raise RuntimeError("消息总线未启动")
         
-        # 创建Future对象
-        future = asyncio.Future()
-        self._response_waiters[message_id] = future
+        # 复用发布前通过 expect 登记的 Future，没有则新建
+        future = self.expect(message_id)
         
         try:
             # 等待响应，带超时
@@ -246,8 +262,7 @@ class MCPMessageBus:
             return None
         finally:
             # 清理等待器
-            if message_id in self._response_waiters:
-                del self._response_waiters[message_id]
+            self.discard(message_id)
 
     def get_message_history(
         self, 
@@ -0,0 +1,78 @@
+"""
+限流工具模块
+按模型服务商维护令牌桶，调用外部服务前获取令牌，避免触发服务商限流
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+from config import config
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，容量即允许的突发请求数"""
+
+    __slots__ = ("rate", "capacity", "tokens", "last", "_lock")
+
+    def __init__(self, requests_per_minute: float, capacity: Optional[float] = None):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute 必须大于 0")
+        self.rate = requests_per_minute / 60.0          # 每秒补充的令牌数
+        self.capacity = capacity or requests_per_minute
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        """按距上次补充的时间补充令牌"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_acquire(self, n: float = 1) -> bool:
+        """尝试立即获取令牌，不足时返回 False"""
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    async def acquire(self, n: float = 1):
+        """获取令牌，不足时等待补充；等待者按到达顺序获取"""
+        if n > self.capacity:
+            raise ValueError(f"请求的令牌数 {n} 超过桶容量 {self.capacity}")
+
+        # 锁在首次调用时创建，绑定到实际运行的事件循环
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while not self.try_acquire(n):
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+def _build_buckets() -> Dict[str, TokenBucket]:
+    """根据模型配置为每个服务商创建令牌桶"""
+    providers = (
+        config.models.video_models
+        + config.models.voice_models
+        + config.models.music_models
+        + config.models.editing_tools
+    )
+    return {p.name: TokenBucket(p.requests_per_minute) for p in providers}
+
+
+# 服务商令牌桶，导入时按配置创建
+_BUCKETS: Dict[str, TokenBucket] = _build_buckets()
+
+# 未配置的服务商使用的默认速率
+_DEFAULT_REQUESTS_PER_MINUTE = 60
+
+
+def get_bucket(provider: str) -> TokenBucket:
+    """获取服务商的令牌桶，未配置的服务商按默认速率创建"""
+    bucket = _BUCKETS.get(provider)
+    if bucket is None:
+        bucket = _BUCKETS[provider] = TokenBucket(_DEFAULT_REQUESTS_PER_MINUTE)
+    return bucket
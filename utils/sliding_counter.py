@@ -0,0 +1,52 @@
+"""
+滑动窗口计数工具模块
+将时间窗口划分为若干固定时长的桶，按键计数，过期的桶整体丢弃
+"""
+
+import time
+from collections import Counter, deque
+from typing import Deque, Hashable
+
+
+class BucketWindow:
+    """
+    分桶滑动窗口计数器
+
+    窗口由 buckets 个时长为 bucket_seconds 的桶组成，计数写入当前桶，
+    统计时对所有未过期的桶求和。相比固定窗口不会在窗口边界放过成倍的突发请求，
+    相比记录每次请求时间戳的滚动窗口，内存只与桶数和活跃键数有关。
+    """
+
+    __slots__ = ("_bucket_seconds", "_buckets", "_current")
+
+    def __init__(self, buckets: int = 5, bucket_seconds: float = 60.0):
+        if buckets <= 0 or bucket_seconds <= 0:
+            raise ValueError("buckets 和 bucket_seconds 必须大于 0")
+        self._bucket_seconds = bucket_seconds
+        self._buckets: Deque[Counter] = deque([Counter()], maxlen=buckets)
+        self._current = self._slot()
+
+    def _slot(self) -> int:
+        """当前时间所在的桶序号"""
+        return int(time.monotonic() // self._bucket_seconds)
+
+    def _rotate(self):
+        """按经过的时间追加新桶，超出窗口的旧桶由 deque 自动丢弃"""
+        slot = self._slot()
+        elapsed = slot - self._current
+        if elapsed <= 0:
+            return
+        for _ in range(min(elapsed, self._buckets.maxlen)):
+            self._buckets.append(Counter())
+        self._current = slot
+
+    def incr(self, key: Hashable, n: int = 1) -> int:
+        """为键计数并返回窗口内的总数"""
+        self._rotate()
+        self._buckets[-1][key] += n
+        return sum(bucket[key] for bucket in self._buckets)
+
+    def sum(self, key: Hashable) -> int:
+        """返回键在窗口内的总数"""
+        self._rotate()
+        return sum(bucket[key] for bucket in self._buckets)
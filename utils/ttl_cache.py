@@ -0,0 +1,82 @@
+"""
+TTL 缓存工具模块
+为无参数的异步函数（如只读 API 接口）提供带过期时间的结果缓存
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type
+
+logger = logging.getLogger("mcp.ttl_cache")
+
+
+def ttl_cache(seconds: float, stale_if_error: float = 0.0,
+              reraise: Tuple[Type[BaseException], ...] = ()):
+    """
+    异步函数 TTL 缓存装饰器
+
+    - 缓存有效期内直接返回上一次的结果
+    - 缓存失效时只有一个调用者重新计算，并发调用者等待其结果（single-flight）
+    - 默认重新计算出错时直接抛出异常；stale_if_error 大于 0 时，
+      过期不超过 stale_if_error 秒的旧结果可作为兜底返回
+    - reraise 中的异常类型（如 HTTPException）始终抛出，不使用旧结果兜底
+    - 被装饰函数提供 cache_clear() 用于主动失效
+
+    Args:
+        seconds: 缓存有效期（秒）
+        stale_if_error: 刷新失败时允许返回的旧结果最大过期时长（秒），0 表示不兜底
+        reraise: 始终向上抛出的异常类型
+    """
+    def decorator(func: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        state = {"value": None, "expires_at": 0.0, "has_value": False}
+        lock: Optional[asyncio.Lock] = None
+        lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        @functools.wraps(func)
+        async def wrapper():
+            nonlocal lock, lock_loop
+            if state["has_value"] and time.monotonic() < state["expires_at"]:
+                return state["value"]
+
+            # 锁绑定到创建时的事件循环，换了事件循环（如测试客户端、热重载）时重新创建
+            loop = asyncio.get_running_loop()
+            if lock is None or lock_loop is not loop:
+                lock = asyncio.Lock()
+                lock_loop = loop
+
+            async with lock:
+                # 等锁期间其他调用者可能已经完成刷新
+                if state["has_value"] and time.monotonic() < state["expires_at"]:
+                    return state["value"]
+
+                try:
+                    value = await func()
+                except reraise:
+                    raise
+                except Exception as e:
+                    stale_deadline = state["expires_at"] + stale_if_error
+                    if not state["has_value"] or time.monotonic() >= stale_deadline:
+                        raise
+                    logger.warning("刷新缓存 %s 失败，返回旧结果: %s", func.__name__, e)
+                    return state["value"]
+
+                state["value"] = value
+                state["has_value"] = True
+                state["expires_at"] = time.monotonic() + seconds
+                return value
+
+        def cache_clear():
+            """清空缓存结果并重置锁"""
+            nonlocal lock, lock_loop
+            lock = None
+            lock_loop = None
+            state["value"] = None
+            state["has_value"] = False
+            state["expires_at"] = 0.0
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator